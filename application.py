@@ -452,6 +452,14 @@ def handle_controller_update(update_dict):
             world.controllers[0].search_algorithm.iterations_per_step = iterations_per_step
             logger.info(f'Client {sid} algorithm update request: setting iterations per step to [{iterations_per_step}]')
 
+        elif key == 'time_budget':
+
+            # TODO provide native multi robot support
+            # Milliseconds each step can take, 0 or None to run iterations_per_step iterations instead
+            time_budget = float(value) if value else 0
+            world.controllers[0].search_algorithm.time_budget = time_budget / 1000 if time_budget > 0 else None
+            logger.info(f'Client {sid} algorithm update request: setting time budget per step to [{time_budget}] ms')
+
         elif key == 'expire':
 
             # TODO provide native multi robot support
@@ -497,10 +505,14 @@ def handle_algorithm_control(algorithm):
 
     # TODO provide native multi robot support
     world = client_data[sid]['data']
+    time_budget = world.controllers[0].search_algorithm.time_budget
     world.controllers[0] = Controller(
         world.robots[0], algorithm_class(world.map, start=world.robots[0].current_pose.as_point())
     )
 
+    # The time budget is a setting of the client, not of the algorithm
+    world.controllers[0].search_algorithm.time_budget = time_budget
+
     send_world_data(sid)
 
     logger.info(f'Client {sid} controller update request: selected algorithm {algorithm}')
@@ -6,6 +6,15 @@ class Node:
         self.cost = cost
         self.heuristic = heuristic
 
+        # Nodes that have this one as parent
+        self.children = []
+
+        # False until the edge from the parent is checked for collisions, with lazy collision checking
+        self.edge_checked = True
+
+        # Position of the node in the list of nodes of its tree, -1 if it is not in one
+        self.index = -1
+
     def __str__(self):
         return f'Node ({self.point})'
 
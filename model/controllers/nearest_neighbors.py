@@ -0,0 +1,176 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+class NearestNeighbors:
+    """
+    Incremental index of 2D points for nearest neighbor and radius queries. Points are
+    identified by the order they have been added in (so the index of a point is also
+    its index in a list kept alongside, like the nodes of a tree). Removing a point
+    moves the last one to its index, like a swap-remove on that list.
+    The points added up to the last rebuild are in a KD-tree, the ones added after
+    that are in a tail that is scanned linearly; the tree is rebuilt when the tail
+    gets too long compared to it, so the cost of the rebuilds is spread over many
+    insertions and queries stay logarithmic. Removed points are only marked as such
+    and skipped by the queries, they are dropped the next time the tree is rebuilt.
+    """
+
+    def __init__(self, points=(), min_tail_size=128, tail_fraction=1 / 16):
+
+        # Rebuild the tree when the tail (or the removed points) are more than this many
+        # points or this fraction of the tree
+        self.min_tail_size = min_tail_size
+        self.tail_fraction = tail_fraction
+
+        # Points are stored in slots, the slot of a point changes only when the tree is rebuilt
+        self._points = np.empty((64, 2))
+        self._size = 0
+
+        # Index of the point in each slot (-1 if it has been removed) and slot of each point
+        self._owners = np.empty(64, dtype=np.int64)
+        self._slots = np.empty(64, dtype=np.int64)
+        self._count = 0
+        self._removed = 0
+
+        # KD-tree over the first _indexed slots
+        self._tree = None
+        self._indexed = 0
+
+        self.rebuild(points)
+
+    def __len__(self):
+        return self._count
+
+    def rebuild(self, points):
+        """
+        Replace the points of the index with the given ones
+        """
+
+        points = np.asarray([(point.x, point.y) for point in points], dtype=np.float64).reshape(-1, 2)
+
+        capacity = max(64, 2 * len(points))
+        self._points = np.empty((capacity, 2))
+        self._points[:len(points)] = points
+        self._owners = np.empty(capacity, dtype=np.int64)
+        self._owners[:len(points)] = np.arange(len(points))
+        self._slots = np.empty(capacity, dtype=np.int64)
+        self._slots[:len(points)] = np.arange(len(points))
+
+        self._size = self._count = len(points)
+        self._removed = 0
+        self._build_tree()
+
+    def _build_tree(self):
+
+        # Drop the slots of the removed points
+        if self._removed > 0:
+            alive = self._owners[:self._size] >= 0
+            self._points[:self._count] = self._points[:self._size][alive]
+            self._owners[:self._count] = self._owners[:self._size][alive]
+            self._slots[self._owners[:self._count]] = np.arange(self._count)
+            self._size = self._count
+            self._removed = 0
+
+        self._indexed = self._size
+        self._tree = cKDTree(self._points[:self._size]) if self._size > 0 else None
+
+    def add(self, point):
+        """
+        Add a point to the index, returns its index
+        """
+
+        if self._size == len(self._points):
+            capacity = 2 * len(self._points)
+            points = np.empty((capacity, 2))
+            points[:self._size] = self._points[:self._size]
+            self._points = points
+            owners = np.empty(capacity, dtype=np.int64)
+            owners[:self._size] = self._owners[:self._size]
+            self._owners = owners
+            slots = np.empty(capacity, dtype=np.int64)
+            slots[:self._count] = self._slots[:self._count]
+            self._slots = slots
+
+        self._points[self._size] = (point.x, point.y)
+        self._owners[self._size] = self._count
+        self._slots[self._count] = self._size
+        self._size += 1
+        self._count += 1
+
+        if self._size - self._indexed > max(self.min_tail_size, self._indexed * self.tail_fraction):
+            self._build_tree()
+
+        return self._count - 1
+
+    def remove(self, index):
+        """
+        Remove the point with the given index, the last point takes its index
+        """
+
+        last = self._count - 1
+        self._owners[self._slots[index]] = -1
+        if index != last:
+            self._slots[index] = self._slots[last]
+            self._owners[self._slots[index]] = index
+
+        self._count -= 1
+        self._removed += 1
+
+        if self._removed > max(self.min_tail_size, self._count * self.tail_fraction):
+            self._build_tree()
+
+    def nearest(self, point):
+        """
+        Returns the index of the point nearest to the given one, -1 if the index is empty
+        """
+
+        best_slot, best_distance = -1, np.inf
+
+        if self._tree is not None:
+            best_distance, best_slot = self._tree.query((point.x, point.y))
+            best_slot = int(best_slot)
+
+            # Look at more and more neighbors, until one that has not been removed
+            k = 1
+            while self._owners[best_slot] < 0:
+                if k >= self._indexed:
+                    best_slot, best_distance = -1, np.inf
+                    break
+
+                ranks = list(range(k + 1, min(2 * k, self._indexed) + 1))
+                distances, slots = self._tree.query((point.x, point.y), k=ranks)
+                alive = np.flatnonzero(self._owners[slots] >= 0)
+                if len(alive) > 0:
+                    best_distance, best_slot = distances[alive[0]], int(slots[alive[0]])
+                k = min(2 * k, self._indexed)
+
+        if self._size > self._indexed:
+            tail = self._points[self._indexed:self._size]
+            distances = np.hypot(tail[:, 0] - point.x, tail[:, 1] - point.y)
+            distances[self._owners[self._indexed:self._size] < 0] = np.inf
+            i = int(np.argmin(distances))
+            if distances[i] < best_distance:
+                best_slot = self._indexed + i
+
+        return int(self._owners[best_slot]) if best_slot >= 0 else -1
+
+    def within(self, point, radius):
+        """
+        Returns the indices, in increasing order, of the points within radius from the given one
+        """
+
+        slots = []
+
+        if self._tree is not None:
+            slots = self._tree.query_ball_point((point.x, point.y), radius)
+
+        if self._size > self._indexed:
+            tail = self._points[self._indexed:self._size]
+            distances = np.hypot(tail[:, 0] - point.x, tail[:, 1] - point.y)
+            slots = list(slots) + (np.flatnonzero(distances <= radius) + self._indexed).tolist()
+
+        if len(slots) == 0:
+            return []
+
+        owners = self._owners[slots]
+        return sorted(owners[owners >= 0].tolist())
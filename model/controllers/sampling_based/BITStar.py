@@ -0,0 +1,259 @@
+import heapq
+import itertools
+import math
+
+import numpy as np
+
+from model.controllers.sampling_based_algorithm import SamplingBased
+from model.controllers.nearest_neighbors import NearestNeighbors
+from model.controllers.graph import Node
+from model.geometry.ellipse import Ellipse
+from model.geometry.point import Point
+from model.geometry.segment import Segment
+
+
+class BITStar(SamplingBased):
+    """
+    Batch Informed Trees (BIT*). Samples are drawn in batches, all at once; until a
+    path is found they cover the whole map, then only the ellipse of the points that
+    could be on a shorter path (the informed set, with the start and the goal as foci).
+    The tree is grown from the start over the implicit graph of the samples, connecting
+    each point to the ones within a radius that shrinks as the points grow in number.
+    The edges are processed in order of the estimated cost of the path through them,
+    the straight line distance, and they are checked for collisions lazily, only when
+    their turn comes and only if they could still improve the tree or the solution.
+    When no edge left can improve the solution the batch is over and a new one starts.
+    Samples are only drawn away from the obstacles, and at most max_samples of the ones
+    not connected yet are kept across the batches, the oldest are dropped first. The
+    search stops once the solution is within tolerance of the straight line to the goal.
+    """
+
+    def __init__(self,
+                 world_map,
+                 start=Point(0, 0),
+                 margin=0.2,
+                 iterations_per_step=1,
+                 max_iterations=3000,
+                 batch_size=100,
+                 rewire_factor=1.1,
+                 max_samples=1000,
+                 tolerance=0.01
+                 ):
+
+        self.batch_size = batch_size
+        self.rewire_factor = rewire_factor
+
+        # Samples not connected yet kept across the batches
+        self.max_samples = max_samples
+
+        # Relative tolerance on the length of the straight line to the goal
+        self.tolerance = tolerance
+
+        # Points not connected to the tree yet, as nodes with infinite cost, and their index
+        self.samples = []
+        self.samples_index = NearestNeighbors()
+
+        self.goal_node = None
+        self.best_cost = math.inf
+        self.radius = math.inf
+
+        # Heaps of (key, counter, vertex) and (key, counter, vertex, node) entries
+        self.vertex_queue = []
+        self.edge_queue = []
+        self.counter = itertools.count()
+
+        # Ids of the vertices expanded at least once, later expansions only look for new samples
+        self.expanded = set()
+
+        super().__init__(
+            world_map,
+            start,
+            margin=margin,
+            iterations_per_step=iterations_per_step,
+            max_iterations=max_iterations,
+            dynamic=False,
+            goal_sample_rate=0
+        )
+
+    def pre_search(self):
+
+        self.set_nodes([Node(self.start)])
+
+        # The goal is a sample like the others, the solution is its cost once it joins the tree
+        self.goal_node = Node(self.world_map.goal, cost=math.inf)
+        self.samples = [self.goal_node]
+        self.samples_index.rebuild([self.goal_node.point])
+
+        self.best_cost = math.inf
+        self.radius = math.inf
+        self.vertex_queue = []
+        self.edge_queue = []
+        self.expanded = set()
+
+        self.update_draw_list()
+
+    def can_run(self):
+        # Nothing can be shorter than the straight line to the goal
+        return (self.current_iteration < self.max_iterations and
+                self.best_cost > (1 + self.tolerance) * self.cost_to_go(self.start))
+
+    def cost_to_come(self, point):
+        return point.distance(self.start)
+
+    def cost_to_go(self, point):
+        return point.distance(self.world_map.goal)
+
+    def informed_set(self):
+        """
+        Returns the ellipse of the points through which a path can be shorter than the best one
+        """
+
+        start, goal = self.start, self.world_map.goal
+        center = Point((start.x + goal.x) / 2, (start.y + goal.y) / 2)
+
+        a = self.best_cost / 2
+        b = math.sqrt(max(a ** 2 - (start.distance(goal) / 2) ** 2, 0))
+
+        return Ellipse(center, a, b, math.atan2(goal.y - start.y, goal.x - start.x))
+
+    def sample_batch(self):
+        """
+        Returns a (n, 2) array of points sampled in the informed set and within the map,
+        away from the obstacles
+        """
+
+        min_x, min_y, max_x, max_y = self.world_map.map_boundaries
+
+        if self.best_cost == math.inf:
+            points = np.column_stack((np.random.uniform(min_x, max_x, self.batch_size),
+                                      np.random.uniform(min_y, max_y, self.batch_size)))
+        else:
+            points = self.informed_set().generate_points_inside(self.batch_size)
+            inside = ((points[:, 0] >= min_x) & (points[:, 0] <= max_x) &
+                      (points[:, 1] >= min_y) & (points[:, 1] <= max_y))
+            points = points[inside]
+
+        # No edge can reach the points in the obstacles, a zero length segment collides where its point does
+        return points[~self.check_segments(points, points)]
+
+    def new_batch(self):
+
+        # Drop the samples that joined the tree and the ones that can't improve the solution
+        self.samples = [sample for sample in self.samples if sample.cost == math.inf and
+                        self.cost_to_come(sample.point) + self.cost_to_go(sample.point) < self.best_cost]
+        self.samples.extend(Node(Point(x, y), cost=math.inf) for x, y in self.sample_batch())
+
+        # Past max_samples the oldest samples are dropped first, but the goal (always the first one) stays
+        excess = len(self.samples) - self.max_samples
+        if excess > 0:
+            first = 1 if self.samples[0] is self.goal_node else 0
+            del self.samples[first:first + excess]
+
+        self.samples_index.rebuild([sample.point for sample in self.samples])
+
+        # Radius of the neighborhood, it shrinks as the density of the points grows
+        min_x, min_y, max_x, max_y = self.world_map.map_boundaries
+        measure = (max_x - min_x) * (max_y - min_y)
+        if self.best_cost < math.inf:
+            ellipse = self.informed_set()
+            measure = min(measure, math.pi * ellipse.a * ellipse.b)
+
+        count = len(self.nodes) + len(self.samples)
+        self.radius = self.rewire_factor * 2 * math.sqrt(1.5 * measure / math.pi * math.log(count) / count)
+
+        self.edge_queue = []
+        self.vertex_queue = []
+        for vertex in self.nodes:
+            key = vertex.cost + self.cost_to_go(vertex.point)
+            if key < self.best_cost:
+                heapq.heappush(self.vertex_queue, (key, next(self.counter), vertex))
+
+    def queue_edge(self, vertex, node):
+        """
+        Queue the edge if it could improve the solution, its collisions are checked later
+        """
+
+        dist = vertex.point.distance(node.point)
+        heuristic = self.cost_to_go(node.point)
+
+        if self.cost_to_come(vertex.point) + dist + heuristic < self.best_cost:
+            heapq.heappush(self.edge_queue, (vertex.cost + dist + heuristic, next(self.counter), vertex, node))
+
+    def expand_vertex(self, vertex):
+
+        if vertex.cost + self.cost_to_go(vertex.point) >= self.best_cost:
+            return
+
+        for i in self.samples_index.within(vertex.point, self.radius):
+            if self.samples[i].cost == math.inf:
+                self.queue_edge(vertex, self.samples[i])
+
+        # The edges towards the other vertices are only considered the first time, they
+        # can rewire the tree
+        if id(vertex) not in self.expanded:
+            self.expanded.add(id(vertex))
+
+            for i in self.nodes_within(vertex.point, self.radius):
+                node = self.nodes[i]
+                if (node is not vertex and node is not vertex.parent and node.parent is not vertex and
+                        vertex.cost + vertex.point.distance(node.point) < node.cost):
+                    self.queue_edge(vertex, node)
+
+    def step_search(self):
+
+        if not self.vertex_queue and not self.edge_queue:
+            self.new_batch()
+
+        # Expand the vertices until the best edge is better than any edge of the best vertex
+        while self.vertex_queue and (not self.edge_queue or self.vertex_queue[0][0] <= self.edge_queue[0][0]):
+            _, _, vertex = heapq.heappop(self.vertex_queue)
+            self.expand_vertex(vertex)
+
+        if not self.edge_queue:
+            return
+
+        key, _, vertex, node = heapq.heappop(self.edge_queue)
+
+        # No edge left can improve the solution, the batch is over
+        if key >= self.best_cost:
+            self.vertex_queue = []
+            self.edge_queue = []
+            return
+
+        # Skip the edge if it can't improve the tree anymore, then check it for collisions
+        new_cost = vertex.cost + vertex.point.distance(node.point)
+        if new_cost + self.cost_to_go(node.point) >= self.best_cost or new_cost >= node.cost:
+            return
+
+        if self.check_collision(vertex.point, node.point):
+            return
+
+        if node.cost < math.inf:
+            self.set_parent(node, vertex)
+            self.update_draw_list()
+        else:
+            node.parent = vertex
+            self.add_node(node)
+            heapq.heappush(self.vertex_queue, (node.cost + self.cost_to_go(node.point), next(self.counter), node))
+
+            # A new leaf only adds itself and its edge to the drawing
+            self.draw_list.append(node.point)
+            self.draw_list.append(Segment(vertex.point, node.point))
+
+        # Any change in the tree can shorten the path to the goal
+        self.best_cost = self.goal_node.cost
+
+    def post_search(self):
+        if self.goal_node.cost < math.inf:
+            self.extract_path(self.goal_node)
+
+    def extract_path(self, node):
+
+        self.path = []
+        node_now = node
+
+        while node_now is not None:
+            self.path.append(Point(node_now.point.x, node_now.point.y))
+            node_now = node_now.parent
+
+        self.path = self.path[::-1]
@@ -1,6 +1,8 @@
+from collections import defaultdict
+import math
+
 from model.controllers.sampling_based_algorithm import SamplingBased
 from model.controllers.graph import Node
-from model.controllers.graph import Edge
 
 from model.geometry.point import Point
 
@@ -19,6 +21,69 @@ class VNode(Node):
         return self.__str__()
 
 
+class EdgeGrid:
+    """
+    Uniform grid over the edges of a tree. Each edge is identified by its child node
+    and stored in all the cells its bounding box overlaps, so the edges near a region
+    are found looking only at the cells the region covers
+    """
+
+    def __init__(self, cell_size):
+
+        if cell_size <= 0:
+            raise ValueError(f'Invalid cell size: {cell_size}')
+
+        self.cell_size = cell_size
+
+        # (i, j) -> {id of the child node: child node}
+        self.cells = defaultdict(dict)
+
+    @staticmethod
+    def edge_bounds(node):
+        start, end = node.parent.point, node.point
+        return min(start.x, end.x), min(start.y, end.y), max(start.x, end.x), max(start.y, end.y)
+
+    def cell_range(self, bounds):
+        min_x, min_y, max_x, max_y = bounds
+        return (math.floor(min_x / self.cell_size), math.floor(min_y / self.cell_size),
+                math.floor(max_x / self.cell_size), math.floor(max_y / self.cell_size))
+
+    def add(self, node):
+        min_i, min_j, max_i, max_j = self.cell_range(self.edge_bounds(node))
+        for i in range(min_i, max_i + 1):
+            for j in range(min_j, max_j + 1):
+                self.cells[(i, j)][id(node)] = node
+
+    def remove(self, node):
+        min_i, min_j, max_i, max_j = self.cell_range(self.edge_bounds(node))
+        for i in range(min_i, max_i + 1):
+            for j in range(min_j, max_j + 1):
+                cell = self.cells[(i, j)]
+                cell.pop(id(node), None)
+                if len(cell) == 0:
+                    del self.cells[(i, j)]
+
+    def query(self, bounds):
+        """
+        Returns the child nodes of the edges in the cells overlapped by the bounds
+        """
+
+        nodes = {}
+        min_i, min_j, max_i, max_j = self.cell_range(bounds)
+
+        # Regions larger than the grid itself, like the whole map, are cheaper to scan cell by cell
+        if (max_i - min_i + 1) * (max_j - min_j + 1) > len(self.cells):
+            for (i, j), cell in self.cells.items():
+                if min_i <= i <= max_i and min_j <= j <= max_j:
+                    nodes.update(cell)
+        else:
+            for i in range(min_i, max_i + 1):
+                for j in range(min_j, max_j + 1):
+                    nodes.update(self.cells.get((i, j), {}))
+
+        return nodes
+
+
 class DynamicRRT(SamplingBased):
     """
     Dynamic RRT (RRT with basic replanning). This algorithm is a simple
@@ -57,15 +122,17 @@ class DynamicRRT(SamplingBased):
         # or we need to look for updates
         self.need_for_path = True
 
-        # We inherit the node and edge lists from the SamplingBased class
+        # We inherit the node list from the SamplingBased class, the edges
+        # of the tree are indexed by the edge grid
+        self.edge_grid = EdgeGrid(step_length)
 
         self.waypoints = []  # Cached nodes
 
         self.path_nodes = []  # Equivalent to path, but containing nodes
 
-        # Number of obstacles. This will be used to check if something has
-        # changed and we need to trim the tree/update the path
-        self.num_obstacles = len(world_map.obstacles)
+        # Version of the map we last synced with. This will be used to get the
+        # changes that occurred since then and trim the tree/update the path
+        self.map_version = world_map.version
 
         # Uniform with the interface (it expects the path to contain points)
         # self.path_wrapper = PathWrapper()
@@ -82,14 +149,16 @@ class DynamicRRT(SamplingBased):
 
     def pre_search(self):
 
-        self.nodes = [VNode(self.start)]
-        self.edges = []
+        self.set_nodes([VNode(self.start)])
+
+        # Edges are at most a step long, so they span at most 2x2 cells
+        self.edge_grid = EdgeGrid(self.step_length)
 
         self.waypoints = []
         self.path_nodes = []
         self.need_for_path = True
         self.goal_reached = False
-        self.num_obstacles = len(self.world_map.obstacles)
+        self.map_version = self.world_map.version
 
     def step_search(self):
 
@@ -103,25 +172,31 @@ class DynamicRRT(SamplingBased):
 
             self.world_map.enable()  # Ensure map changes are enabled
 
-            # Changes occurred (different number of obstacles)
-            if self.num_obstacles != len(self.world_map.obstacles):
+            # Changes occurred since the last sync
+            changes = self.world_map.changes_since(self.map_version)
+            if len(changes) > 0:
+
+                # Update the version of the map we synced with
+                self.map_version = self.world_map.version
 
-                # Update the number of obstacles in the map
-                self.num_obstacles = len(self.world_map.obstacles)
+                # Removing obstacles can't invalidate any edge, only the regions
+                # where obstacles have been added (or replaced) need to be checked
+                regions = [change for change in changes if change.op != 'remove']
+                if len(regions) > 0:
 
-                # Invalidate the nodes by iterating through the edges and checking
-                # where a collision happened
-                self.invalidate_nodes()
+                    # Invalidate the nodes whose edge from the parent collides, looking
+                    # only at the edges in the changed regions
+                    invalid_nodes = self.invalidate_nodes(regions)
 
-                # Propagate the invalid flag from parent to child
-                self.trim()
+                    # Propagate the invalid flag from parent to child
+                    self.trim(invalid_nodes)
 
-                # Extract waypoints from the invalidated portion of the nodes_path
-                self.extract_waypoints()
+                    # Extract waypoints from the invalidated portion of the nodes_path
+                    self.extract_waypoints()
 
-                # Check if the path is invalid
-                if self.is_path_invalid():
-                    self.need_for_path = True
+                    # Check if the path is invalid
+                    if self.is_path_invalid():
+                        self.need_for_path = True
 
         # Update drawing list
         self.update_draw_list()
@@ -133,8 +208,8 @@ class DynamicRRT(SamplingBased):
         node_new = self.new_state(node_near, node_rand)
 
         if node_new and not self.check_collision(node_near.point, node_new.point):
-            self.nodes.append(node_new)
-            self.edges.append(Edge(node_near, node_new))
+            self.add_node(node_new)
+            self.edge_grid.add(node_new)
             dist = node_new.point.distance(self.world_map.goal)
 
             if dist <= self.step_length:
@@ -160,13 +235,6 @@ class DynamicRRT(SamplingBased):
             y = np.random.uniform(self.world_map.map_boundaries[1], self.world_map.map_boundaries[3])
             return VNode(Point(x, y))
 
-    def nearest_neighbor(self, n):
-        """
-        Returns the nearest node to the one passed as argument
-        """
-
-        return min(self.nodes, key=lambda nd: nd.point.distance(n.point))
-
     def new_state(self, node_start, node_end):
         """
         Given two nodes (each containing a point), returns a new node
@@ -209,15 +277,35 @@ class DynamicRRT(SamplingBased):
         # Reverse the path
         self.path_nodes = self.path_nodes[::-1]
 
-    def invalidate_nodes(self):
+    def invalidate_nodes(self, changes=None):
         """
         Check where there is an obstacle between two nodes and
-        set them as invalid
+        set them as invalid. If a list of map changes is provided,
+        only the edges that overlap the changed regions are checked.
+        Returns the nodes set as invalid
         """
 
-        for edge in self.edges:
-            if self.check_collision(edge.parent_node.point, edge.child_node.point):
-                edge.child_node.valid = False
+        # A change without bounds covers the whole map
+        if changes is None or any(change.bounds is None for change in changes):
+            nodes = [node for node in self.nodes if node.parent is not None]
+        else:
+            # Candidates from the grid, then only the edges whose bounds overlap a change
+            candidates = {}
+            reach = self.margin / 2
+            for change in changes:
+                min_x, min_y, max_x, max_y = change.bounds
+                candidates.update(self.edge_grid.query((min_x - reach, min_y - reach, max_x + reach, max_y + reach)))
+
+            nodes = [node for node in candidates.values()
+                     if any(change.overlaps(EdgeGrid.edge_bounds(node), reach) for change in changes)]
+
+        collisions = self.check_collisions([node.parent.point for node in nodes], [node.point for node in nodes])
+
+        invalid_nodes = [node for node, collision in zip(nodes, collisions) if collision]
+        for node in invalid_nodes:
+            node.valid = False
+
+        return invalid_nodes
 
     def invalidate_path(self):
         """
@@ -249,21 +337,32 @@ class DynamicRRT(SamplingBased):
                 return True
         return False
 
-    def trim(self):
+    def trim(self, invalid_nodes):
         """
-        Propagate the invalid flag from parent to child
+        Propagate the invalid flag from parent to child, through the children
+        of the invalid nodes, and remove the invalid subtrees from the tree
         """
 
-        for node in self.nodes:
+        if len(invalid_nodes) == 0:
+            return
+
+        # Detach the invalid subtrees from the valid part of the tree
+        for node in invalid_nodes:
+            if node.parent.valid:
+                node.parent.children = [child for child in node.parent.children if child is not node]
 
-            # If the node has a parent and the parent is not valid
-            if node.parent is not None and not node.parent.valid:
+        removed = []
+        subtree = list(invalid_nodes)
+        while subtree:
+            node = subtree.pop()
+            node.valid = False
+            self.edge_grid.remove(node)
+            removed.append(node)
 
-                # Set also the child as invalid
-                node.valid = False
+            subtree.extend(child for child in node.children if child.valid)
 
-        self.nodes = [node for node in self.nodes if node.valid]
-        self.edges = [Edge(node.parent, node) for node in self.nodes[1:len(self.nodes)]]
+        # Only the nodes of the invalid subtrees are removed, the index is not rebuilt
+        self.remove_nodes(removed)
 
     def extract_waypoints(self):
 
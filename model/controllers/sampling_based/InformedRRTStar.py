@@ -21,8 +21,9 @@ class InformedRRTStar(SamplingBased):
                  search_radius=0.5,
                  max_iterations=1000,
                  goal_sample_rate=0.05,
+                 lazy=False,
                  ):
-        super().__init__(world_map, start, margin, iterations_per_step, max_iterations)
+        super().__init__(world_map, start, margin, iterations_per_step, max_iterations, lazy=lazy)
 
         self.step_length = step_length
         self.search_radius = search_radius
@@ -35,7 +36,7 @@ class InformedRRTStar(SamplingBased):
 
     def pre_search(self):
 
-        self.nodes = [Node(self.start)]
+        self.set_nodes([Node(self.start)])
         self.edges = []
         self.need_for_path = True
         self.ellipse = None
@@ -55,7 +56,7 @@ class InformedRRTStar(SamplingBased):
         if node_new and not self.check_collision(node_near.point, node_new.point):
             neighbor_index = self.find_neighborhood(node_new)
 
-            self.nodes.append(node_new)
+            self.add_node(node_new)
 
             if neighbor_index:
                 self.choose_parent(node_new, neighbor_index)
@@ -63,7 +64,7 @@ class InformedRRTStar(SamplingBased):
 
             dist = self.distance_to_goal(node_new)
 
-            if dist <= self.step_length:
+            if dist <= self.step_length and (not self.lazy or self.verify_path(node_new, self.search_radius)):
                 self.extract_path(node_new)
 
             self.update_draw_list()
@@ -76,7 +77,7 @@ class InformedRRTStar(SamplingBased):
         if node_new and not self.check_collision(node_near.point, node_new.point):
             neighbor_index = self.find_neighborhood(node_new)
 
-            self.nodes.append(node_new)
+            self.add_node(node_new)
 
             if neighbor_index:
                 self.choose_parent(node_new, neighbor_index)
@@ -84,7 +85,7 @@ class InformedRRTStar(SamplingBased):
 
             dist = self.distance_to_goal(node_new)
 
-            if dist <= self.step_length:
+            if dist <= self.step_length and (not self.lazy or self.verify_path(node_new, self.search_radius)):
                 self.extract_path(node_new)
 
             self.update_draw_list()
@@ -109,30 +110,49 @@ class InformedRRTStar(SamplingBased):
         return super().check_collision(point_start, point_end)
 
     def search_goal_parent(self):
-        dist_list = [self.distance_to_goal(n) for n in self.nodes]
-        node_index = [i for i in range(len(dist_list)) if dist_list[i] <= self.search_radius]
+
+        # Check the candidates, and the path to them, in order of cost until the first valid one
+        if self.lazy:
+            candidates = [self.nodes[i] for i in self.nodes_within(self.world_map.goal, self.search_radius)
+                          if not self.nodes[i].point == self.world_map.goal]
+            candidates.sort(key=lambda node: self.distance_to_goal(node) + self.compute_cost(node))
+            for node in candidates:
+
+                # The candidates cut off while verifying the previous ones are not in the tree anymore
+                if (node.index >= 0 and not self.check_edge(node.point, self.world_map.goal) and
+                        self.verify_path(node, self.search_radius)):
+                    return node.index
+            return -1
+
+        node_index = [i for i in self.nodes_within(self.world_map.goal, self.search_radius)
+                      if not self.nodes[i].point == self.world_map.goal and
+                      not self.check_collision(self.nodes[i].point, self.world_map.goal)]
 
         if len(node_index) > 0:
-            cost_list = [dist_list[i] + self.compute_cost(self.nodes[i]) for i in node_index
-                         if not self.nodes[i].point == self.world_map.goal and
-                         not self.check_collision(self.nodes[i].point, self.world_map.goal)]
+            cost_list = [self.distance_to_goal(self.nodes[i]) + self.compute_cost(self.nodes[i]) for i in node_index]
             return node_index[int(np.argmin(cost_list))]
         return -1
 
     def find_neighborhood(self, node_new):
-        dist_table = [np.hypot(nd.point.x - node_new.point.x, nd.point.y - node_new.point.y) for nd in self.nodes]
-        dist_table_index = [ind for ind in range(len(dist_table)) if dist_table[ind] <= self.search_radius and
-                            not node_new.point == self.world_map.goal and
-                            not self.check_collision(node_new.point, self.nodes[ind].point)]
 
-        return dist_table_index
+        if node_new.point == self.world_map.goal:
+            return []
+
+        dist_table_index = self.nodes_within(node_new.point, self.search_radius)
+
+        # The edges are checked later, only the ones that matter
+        if self.lazy:
+            return dist_table_index
+
+        # Check the edges towards all the nodes in the neighborhood at once
+        collisions = self.check_collisions([node_new.point] * len(dist_table_index),
+                                           [self.nodes[ind].point for ind in dist_table_index])
+
+        return [ind for ind, collision in zip(dist_table_index, collisions) if not collision]
 
     def has_path(self):
         return len(self.path) > 0 and self.path[-1] == self.world_map.goal
 
-    def nearest_neighbor(self, n):
-        return min(self.nodes, key=lambda nd: nd.point.distance(n.point))
-
     def new_state(self, node_start, node_end):
         dist, theta = self.get_distance_and_angle(node_start, node_end)
 
@@ -157,16 +177,22 @@ class InformedRRTStar(SamplingBased):
         self.path_nodes = self.path_nodes[::-1]
 
     def choose_parent(self, node_new, neighbor_index):
+        if self.lazy:
+            self.choose_valid_parent(node_new, [self.nodes[i] for i in neighbor_index])
+            return
+
         cost = [self.get_new_cost(self.nodes[i], node_new) for i in neighbor_index]
         cost_min_index = neighbor_index[int(np.argmin(cost))]
-        node_new.parent = self.nodes[cost_min_index]
+        if self.nodes[cost_min_index] is not node_new.parent:
+            self.set_parent(node_new, self.nodes[cost_min_index])
 
     def rewire(self, node_new, neighbor_index):
         for i in neighbor_index:
             node_neighbor = self.nodes[i]
 
             if self.compute_cost(node_neighbor) > self.get_new_cost(node_new, node_neighbor):
-                node_neighbor.parent = node_new
+                self.set_parent(node_neighbor, node_new)
+                node_neighbor.edge_checked = not self.lazy
 
     def get_new_cost(self, node_start, node_end):
         dist, _ = self.get_distance_and_angle(node_start, node_end)
@@ -178,15 +204,6 @@ class InformedRRTStar(SamplingBased):
         dy = node_end.point.y - node_start.point.y
         return node_start.point.distance(node_end.point), np.arctan2(dy, dx)
 
-    @staticmethod
-    def compute_cost(node):
-        n = node
-        cost = 0.0
-        while n.parent:
-            cost += n.point.distance(n.parent.point)
-            n = n.parent
-        return cost
-
     def generate_random_node(self):
         if np.random.random() > self.goal_sample_rate:
             x = np.random.uniform(-2 * self.world_map.obs_max_dist, 0) + self.world_map.obs_max_dist
@@ -0,0 +1,362 @@
+import heapq
+import math
+import weakref
+
+import numpy as np
+
+from model.controllers.sampling_based_algorithm import SamplingBased
+from model.controllers.nearest_neighbors import NearestNeighbors
+from model.geometry.segment import Segment
+from model.geometry.point import Point
+
+
+class Roadmap:
+    """
+    Undirected graph of collision free points of a map, with the collision free edges
+    between the points within the connection radius. Vertex ids are never reused, the
+    points of the removed vertices are set to None
+    """
+
+    def __init__(self):
+
+        self.points = []
+        self.edges = []  # Vertex -> {adjacent vertex: length}
+        self.index = NearestNeighbors()
+
+        # Number of vertices that have not been removed
+        self.size = 0
+
+        # Version of the map the roadmap is in sync with
+        self.version = None
+
+    def clear(self):
+        self.points = []
+        self.edges = []
+        self.index.rebuild([])
+        self.size = 0
+
+    def add_vertex(self, point):
+        self.points.append(point)
+        self.edges.append({})
+        self.index.add(point)
+        self.size += 1
+        return len(self.points) - 1
+
+    def remove_vertex(self, vertex):
+        for other in self.edges[vertex]:
+            del self.edges[other][vertex]
+        self.edges[vertex] = {}
+        self.points[vertex] = None
+        self.size -= 1
+
+    def add_edge(self, vertex, other):
+        length = self.points[vertex].distance(self.points[other])
+        self.edges[vertex][other] = length
+        self.edges[other][vertex] = length
+
+    def remove_edge(self, vertex, other):
+        del self.edges[vertex][other]
+        del self.edges[other][vertex]
+
+    def within(self, point, radius):
+        return [vertex for vertex in self.index.within(point, radius) if self.points[vertex] is not None]
+
+
+class PRM(SamplingBased):
+    """
+    Probabilistic Roadmap. A roadmap of collision free points and edges is built once for
+    the map and reused by all the queries: changing the goal only connects the start and
+    the new goal to the roadmap and runs A* on it. The roadmaps are stored beside the map,
+    one for each margin, and when the obstacles change they are repaired where the map did:
+    the vertices and the edges under a new obstacle are dropped, and the area freed by a
+    removed obstacle is sampled again and the edges around it are checked again.
+    The roadmap grows by a sample per iteration until it has sample_count vertices; if the
+    goal can't be reached the roadmap grows further and the query is run again.
+    """
+
+    # Map -> {margin: roadmap}, the roadmaps go away with the map
+    roadmaps = weakref.WeakKeyDictionary()
+
+    START = -1
+    GOAL = -2
+
+    def __init__(self,
+                 world_map,
+                 start=Point(0, 0),
+                 margin=0.2,
+                 iterations_per_step=1,
+                 max_iterations=5000,
+                 sample_count=500,
+                 connection_radius=0.8,
+                 ):
+
+        self.sample_count = sample_count
+        self.connection_radius = connection_radius
+
+        # Vertices added to the roadmap beyond sample_count for the queries that failed
+        self.extra_samples = 0
+
+        self.roadmap = None
+        self.query_started = False
+        self.goal_reached = False
+
+        super().__init__(
+            world_map,
+            start,
+            margin=margin,
+            iterations_per_step=iterations_per_step,
+            max_iterations=max_iterations,
+            dynamic=False,
+            goal_sample_rate=0
+        )
+
+    # ---------------------------------- Roadmap --------------------------------- #
+
+    def get_roadmap(self):
+        roadmaps = PRM.roadmaps.setdefault(self.world_map, {})
+        if self.margin not in roadmaps:
+            roadmaps[self.margin] = Roadmap()
+        return roadmaps[self.margin]
+
+    def sync_roadmap(self):
+        """
+        Repair the roadmap where the map changed since the last time it was synced
+        """
+
+        roadmap = self.roadmap
+        changes = [] if roadmap.version is None else self.world_map.changes_since(roadmap.version)
+
+        if any(change.op == 'reset' for change in changes):
+            roadmap.clear()
+            changes = []
+
+        for change in changes:
+
+            # A moved obstacle both frees and covers some space
+            if change.op in ('add', 'move'):
+                self.repair_added(change)
+            if change.op in ('remove', 'move'):
+                self.repair_removed(change)
+
+        roadmap.version = self.world_map.version
+
+    def vertices_near(self, bounds, reach):
+        """
+        Returns the vertices within reach from the bounds
+        """
+
+        min_x, min_y, max_x, max_y = bounds
+        center = Point((min_x + max_x) / 2, (min_y + max_y) / 2)
+        radius = math.hypot(max_x - min_x, max_y - min_y) / 2 + reach
+
+        return self.roadmap.within(center, radius)
+
+    def repair_added(self, change):
+        """
+        Drop the vertices and the edges covered by a new obstacle
+        """
+
+        roadmap = self.roadmap
+
+        vertices = self.vertices_near(change.bounds, self.margin)
+        if vertices:
+            points = np.array([(roadmap.points[vertex].x, roadmap.points[vertex].y) for vertex in vertices])
+            for vertex, collision in zip(vertices, self.check_segments(points, points).tolist()):
+                if collision:
+                    roadmap.remove_vertex(vertex)
+
+        # Edges can cross the obstacle only if they start within the connection radius from it
+        edges = []
+        for vertex in self.vertices_near(change.bounds, self.connection_radius + self.margin):
+            point = roadmap.points[vertex]
+            for other in roadmap.edges[vertex]:
+                other_point = roadmap.points[other]
+                edge_bounds = (min(point.x, other_point.x), min(point.y, other_point.y),
+                               max(point.x, other_point.x), max(point.y, other_point.y))
+                if vertex < other and change.overlaps(edge_bounds, self.margin):
+                    edges.append((vertex, other))
+
+        collisions = self.check_collisions([roadmap.points[vertex] for vertex, _ in edges],
+                                           [roadmap.points[other] for _, other in edges])
+        for (vertex, other), collision in zip(edges, collisions):
+            if collision:
+                roadmap.remove_edge(vertex, other)
+
+    def repair_removed(self, change):
+        """
+        Sample the area freed by a removed obstacle and check again the edges around it
+        """
+
+        min_x, min_y, max_x, max_y = change.bounds
+        map_min_x, map_min_y, map_max_x, map_max_y = self.world_map.map_boundaries
+
+        # Keep the density of the rest of the roadmap
+        area_ratio = (max_x - min_x) * (max_y - min_y) / ((map_max_x - map_min_x) * (map_max_y - map_min_y))
+        for _ in range(math.ceil(self.sample_count * area_ratio)):
+            self.sample_vertex(change.bounds)
+
+        for vertex in self.vertices_near(change.bounds, self.connection_radius + self.margin):
+            self.connect_vertex(vertex)
+
+    def sample_vertex(self, bounds):
+        """
+        Sample a point in the bounds and add it to the roadmap if it is collision free
+        """
+
+        min_x, min_y, max_x, max_y = bounds
+        point = np.array([[np.random.uniform(min_x, max_x), np.random.uniform(min_y, max_y)]])
+
+        if not self.check_segments(point, point)[0]:
+            vertex = self.roadmap.add_vertex(Point(point[0, 0], point[0, 1]))
+            self.connect_vertex(vertex)
+
+    def connect_vertex(self, vertex):
+        """
+        Add the collision free edges between the vertex and the vertices within the connection
+        radius it is not connected to yet
+        """
+
+        roadmap = self.roadmap
+        point = roadmap.points[vertex]
+
+        others = [other for other in roadmap.within(point, self.connection_radius)
+                  if other != vertex and other not in roadmap.edges[vertex]]
+        collisions = self.check_collisions([point] * len(others), [roadmap.points[other] for other in others])
+
+        for other, collision in zip(others, collisions):
+            if not collision:
+                roadmap.add_edge(vertex, other)
+
+    def update_draw_list(self):
+        self.draw_list = []
+        for vertex, point in enumerate(self.roadmap.points):
+            if point is not None:
+                self.draw_list.append(point)
+                self.draw_list.extend(Segment(point, self.roadmap.points[other])
+                                      for other in self.roadmap.edges[vertex] if vertex < other)
+
+    # ----------------------------------- Query ---------------------------------- #
+
+    def pre_search(self):
+
+        self.roadmap = self.get_roadmap()
+        self.sync_roadmap()
+
+        self.extra_samples = 0
+        self.query_started = False
+        self.goal_reached = False
+
+        self.update_draw_list()
+
+    def point_of(self, vertex):
+        if vertex == PRM.START:
+            return self.start
+        if vertex == PRM.GOAL:
+            return self.world_map.goal
+        return self.roadmap.points[vertex]
+
+    def heuristic(self, point):
+        return point.distance(self.world_map.goal)
+
+    def connect_query_point(self, point):
+        """
+        Returns the roadmap vertices within the connection radius that can be reached from the point,
+        with the length of the edges
+        """
+
+        vertices = self.roadmap.within(point, self.connection_radius)
+        collisions = self.check_collisions([point] * len(vertices), [self.roadmap.points[vertex] for vertex in vertices])
+        return {vertex: point.distance(self.roadmap.points[vertex])
+                for vertex, collision in zip(vertices, collisions) if not collision}
+
+    def start_query(self):
+
+        self.start_edges = self.connect_query_point(self.start)
+        self.goal_edges = self.connect_query_point(self.world_map.goal)
+
+        distance = self.start.distance(self.world_map.goal)
+        if distance <= self.connection_radius and not self.check_collision(self.start, self.world_map.goal):
+            self.start_edges[PRM.GOAL] = distance
+
+        self.g_score = {PRM.START: 0.0}
+        self.parents = {PRM.START: None}
+        self.closed_set = set()
+
+        start_heuristic = self.heuristic(self.start)
+        self.open_set = [(start_heuristic, start_heuristic, PRM.START)]
+
+        self.query_started = True
+
+    def adjacent(self, vertex):
+        if vertex == PRM.START:
+            return self.start_edges.items()
+        if vertex in self.goal_edges:
+            return list(self.roadmap.edges[vertex].items()) + [(PRM.GOAL, self.goal_edges[vertex])]
+        return self.roadmap.edges[vertex].items()
+
+    def can_run(self):
+        return not self.goal_reached and self.current_iteration < self.max_iterations
+
+    def step_search(self):
+
+        # Grow the roadmap first
+        if self.roadmap.size < self.sample_count + self.extra_samples:
+            vertex_count = len(self.roadmap.points)
+            self.sample_vertex(self.world_map.map_boundaries)
+            if len(self.roadmap.points) > vertex_count:
+                point = self.roadmap.points[-1]
+                self.draw_list.append(point)
+                self.draw_list.extend(Segment(point, self.roadmap.points[other]) for other in self.roadmap.edges[-1])
+            return
+
+        if not self.query_started:
+            self.start_query()
+
+        # The goal can't be reached with the roadmap as it is, make it denser and try again
+        if not self.open_set:
+            self.extra_samples += self.sample_count // 4
+            self.query_started = False
+            return
+
+        _, _, current_vertex = heapq.heappop(self.open_set)
+        if current_vertex in self.closed_set:
+            return
+
+        if current_vertex == PRM.GOAL:
+            self.goal_reached = True
+            return
+
+        self.closed_set.add(current_vertex)
+
+        current_cost = self.g_score[current_vertex]
+        for vertex, length in self.adjacent(current_vertex):
+
+            new_cost = current_cost + length
+            if vertex not in self.closed_set and new_cost < self.g_score.get(vertex, math.inf):
+                self.g_score[vertex] = new_cost
+                self.parents[vertex] = current_vertex
+
+                new_heuristic = self.heuristic(self.point_of(vertex))
+                heapq.heappush(self.open_set, (new_cost + new_heuristic, new_heuristic, vertex))
+
+    def post_search(self):
+        if self.goal_reached:
+            self.reconstruct_path()
+
+    def reconstruct_path(self):
+        path = []
+        vertex = PRM.GOAL
+
+        while vertex is not None:
+            path.append(self.point_of(vertex))
+            vertex = self.parents[vertex]
+
+        path.reverse()
+
+        # The roadmap vertices are random, pull the path tight skipping the points the
+        # previous waypoint can see past
+        self.path = [path[0]]
+        for k in range(1, len(path) - 1):
+            if self.check_collision(self.path[-1], path[k + 1]):
+                self.path.append(path[k])
+        self.path.append(path[-1])
@@ -34,7 +34,7 @@ class RRT(SamplingBased):
     def pre_search(self):
 
         self.node_new = Node(self.start)
-        self.nodes = [self.node_new]
+        self.set_nodes([self.node_new])
         self.new_node_to_goal_dist = self.node_new.point.distance(self.world_map.goal)
 
     def step_search(self):
@@ -44,7 +44,7 @@ class RRT(SamplingBased):
         self.node_new = self.new_state(node_near, node_rand)
 
         if self.node_new and not self.check_collision(node_near.point, self.node_new.point):
-            self.nodes.append(self.node_new)
+            self.add_node(self.node_new)
             self.new_node_to_goal_dist = self.distance_to_goal(self.node_new)
 
             # Update drawing list
@@ -72,9 +72,6 @@ class RRT(SamplingBased):
     def post_search(self):
         self.extract_path(self.node_new)
 
-    def nearest_neighbor(self, n):
-        return min(self.nodes, key=lambda nd: nd.point.distance(n.point))
-
     def new_state(self, node_start, node_end):
         dist, theta = self.get_distance_and_angle(node_start, node_end)
 
@@ -0,0 +1,158 @@
+from model.controllers.sampling_based_algorithm import SamplingBased
+from model.controllers.nearest_neighbors import NearestNeighbors
+from model.controllers.graph import Node
+
+from model.geometry.segment import Segment
+from model.geometry.point import Point
+
+import numpy as np
+
+
+class RRTConnect(SamplingBased):
+    """
+    RRT-Connect: two trees are grown, one from the start and one from the goal.
+    At each iteration the active tree is extended by a step towards a random sample,
+    then the other tree is extended greedily towards the new node, one step after
+    the other, until it either reaches it, and the two trees are connected, or hits
+    an obstacle. Then the two trees swap roles.
+    The active tree is the one in the nodes list (and in its index) of the base class,
+    the other one is kept aside with its own index and the two are swapped.
+    """
+
+    def __init__(self,
+                 world_map,
+                 start=Point(0, 0),
+                 margin=0.2,
+                 iterations_per_step=1,
+                 max_iterations=5000,
+                 step_length=0.2,
+                 ):
+
+        self.step_length = step_length
+
+        # Tree that is not being extended at the moment, with its index
+        self.other_nodes = []
+        self.other_nodes_index = NearestNeighbors()
+
+        # Root of the tree grown from the start
+        self.start_root = None
+
+        # Nodes of the two trees with the same point, once they are connected
+        self.connection = None
+
+        # The trees grow towards each other, there is no need to sample the goal
+        super().__init__(
+            world_map,
+            start,
+            margin=margin,
+            iterations_per_step=iterations_per_step,
+            max_iterations=max_iterations,
+            dynamic=False,
+            goal_sample_rate=0
+        )
+
+    def pre_search(self):
+
+        self.start_root = Node(self.start)
+        self.set_nodes([self.start_root])
+
+        self.other_nodes = [Node(self.world_map.goal)]
+        self.other_nodes_index.rebuild([self.world_map.goal])
+
+        self.connection = None
+
+    def swap_trees(self):
+        self.nodes, self.other_nodes = self.other_nodes, self.nodes
+        self.nodes_index, self.other_nodes_index = self.other_nodes_index, self.nodes_index
+
+    def can_run(self):
+        return self.connection is None and self.current_iteration < self.max_iterations
+
+    def step_search(self):
+
+        node_rand = self.generate_random_node()
+        node_near = self.nearest_neighbor(node_rand)
+        node_new = self.new_state(node_near, node_rand)
+
+        if node_new.point != node_near.point and not self.check_collision(node_near.point, node_new.point):
+            self.add_node(node_new)
+
+            # Greedily extend the other tree towards the new node
+            self.swap_trees()
+            node_reached = self.connect(node_new)
+
+            if node_reached is not None:
+                self.connection = (node_new, node_reached)
+
+            self.update_draw_list()
+
+        else:
+            self.swap_trees()
+
+    def connect(self, node_target):
+        """
+        Extend the active tree towards the target node until the target is reached or an
+        obstacle is in the way. Returns the node of the active tree on the target, or None
+        """
+
+        node_near = self.nearest_neighbor(node_target)
+
+        while node_near.point != node_target.point:
+
+            node_new = self.new_state(node_near, node_target)
+            if self.check_collision(node_near.point, node_new.point):
+                return None
+
+            self.add_node(node_new)
+            node_near = node_new
+
+        return node_near
+
+    def new_state(self, node_start, node_end):
+        dist, theta = self.get_distance_and_angle(node_start, node_end)
+
+        # Land exactly on the point when it is within a step
+        if dist <= self.step_length:
+            node_new = Node(Point(node_end.point.x, node_end.point.y))
+        else:
+            new_x = node_start.point.x + self.step_length * np.cos(theta)
+            new_y = node_start.point.y + self.step_length * np.sin(theta)
+            node_new = Node(Point(new_x, new_y))
+
+        node_new.parent = node_start
+
+        return node_new
+
+    def update_draw_list(self):
+        self.draw_list = []
+        for node in self.nodes + self.other_nodes:
+            self.draw_list.append(node.point)
+            if node.parent is not None:
+                self.draw_list.append(Segment(node.parent.point, node.point))
+
+    def post_search(self):
+        if self.connection is not None:
+            self.extract_path(*self.connection)
+
+    def extract_path(self, node, other_node):
+
+        # Put first the node of the tree grown from the start
+        node_now = node
+        while node_now.parent is not None:
+            node_now = node_now.parent
+        if node_now is not self.start_root:
+            node, other_node = other_node, node
+
+        # From the start to the connection
+        self.path = []
+        node_now = node
+        while node_now is not None:
+            self.path.append(Point(node_now.point.x, node_now.point.y))
+            node_now = node_now.parent
+        self.path = self.path[::-1]
+
+        # From the connection to the goal
+        node_now = other_node.parent
+        while node_now is not None:
+            self.path.append(Point(node_now.point.x, node_now.point.y))
+            node_now = node_now.parent
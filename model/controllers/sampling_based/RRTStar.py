@@ -18,6 +18,7 @@ class RRTStar(SamplingBased):
                  goal_sample_rate=0.05,
                  step_length=0.2,
                  search_radius=0.5,
+                 lazy=False,
                  ):
 
         self.step_length = step_length
@@ -30,12 +31,13 @@ class RRTStar(SamplingBased):
             iterations_per_step=iterations_per_step,
             max_iterations=max_iterations,
             dynamic=False,
-            goal_sample_rate=goal_sample_rate
+            goal_sample_rate=goal_sample_rate,
+            lazy=lazy
         )
 
     def pre_search(self):
 
-        self.nodes = [Node(self.start)]
+        self.set_nodes([Node(self.start)])
         self.edges = []
 
     def step_search(self):
@@ -48,7 +50,7 @@ class RRTStar(SamplingBased):
 
             neighbor_index = self.find_neighborhood(node_new)
 
-            self.nodes.append(node_new)
+            self.add_node(node_new)
 
             if neighbor_index:
                 self.choose_parent(node_new, neighbor_index)
@@ -68,13 +70,26 @@ class RRTStar(SamplingBased):
         return super().check_collision(point_start, point_end)
 
     def search_goal_parent(self):
-        dist_list = [self.distance_to_goal(n) for n in self.nodes]
-        node_index = [i for i in range(len(dist_list)) if dist_list[i] <= self.search_radius]
+
+        # Check the candidates, and the path to them, in order of cost until the first valid one
+        if self.lazy:
+            candidates = [self.nodes[i] for i in self.nodes_within(self.world_map.goal, self.search_radius)
+                          if not self.nodes[i].point == self.world_map.goal]
+            candidates.sort(key=lambda node: self.distance_to_goal(node) + self.compute_cost(node))
+            for node in candidates:
+
+                # The candidates cut off while verifying the previous ones are not in the tree anymore
+                if (node.index >= 0 and not self.check_edge(node.point, self.world_map.goal) and
+                        self.verify_path(node, self.search_radius)):
+                    return node.index
+            return -1
+
+        node_index = [i for i in self.nodes_within(self.world_map.goal, self.search_radius)
+                      if not self.nodes[i].point == self.world_map.goal and
+                      not self.check_collision(self.nodes[i].point, self.world_map.goal)]
 
         if len(node_index) > 0:
-            cost_list = [dist_list[i] + self.compute_cost(self.nodes[i]) for i in node_index
-                         if not self.nodes[i].point == self.world_map.goal and
-                         not self.check_collision(self.nodes[i].point, self.world_map.goal)]
+            cost_list = [self.distance_to_goal(self.nodes[i]) + self.compute_cost(self.nodes[i]) for i in node_index]
             return node_index[int(np.argmin(cost_list))]
 
         # return len(self.vertex) - 1
@@ -86,19 +101,24 @@ class RRTStar(SamplingBased):
         # r = min(self.search_radius * np.sqrt((np.log(n) / n)), self.discretization_step)
         r = self.search_radius
 
-        dist_table = [np.hypot(nd.point.x - node_new.point.x, nd.point.y - node_new.point.y) for nd in self.nodes]
-        dist_table_index = [ind for ind in range(len(dist_table)) if dist_table[ind] <= r and
-                            not node_new.point == self.world_map.goal and
-                            not self.check_collision(node_new.point, self.nodes[ind].point)]
+        if node_new.point == self.world_map.goal:
+            return []
+
+        dist_table_index = self.nodes_within(node_new.point, r)
 
-        return dist_table_index
+        # The edges are checked later, only the ones that matter
+        if self.lazy:
+            return dist_table_index
+
+        # Check the edges towards all the nodes in the neighborhood at once
+        collisions = self.check_collisions([node_new.point] * len(dist_table_index),
+                                           [self.nodes[ind].point for ind in dist_table_index])
+
+        return [ind for ind, collision in zip(dist_table_index, collisions) if not collision]
 
     def has_path(self):
         return len(self.path) > 0 and self.path[-1] == self.world_map.goal
 
-    def nearest_neighbor(self, n):
-        return min(self.nodes, key=lambda nd: nd.point.distance(n.point))
-
     def new_state(self, node_start, node_end):
         dist, theta = self.get_distance_and_angle(node_start, node_end)
 
@@ -125,16 +145,22 @@ class RRTStar(SamplingBased):
         self.path = self.path[::-1]
 
     def choose_parent(self, node_new, neighbor_index):
+        if self.lazy:
+            self.choose_valid_parent(node_new, [self.nodes[i] for i in neighbor_index])
+            return
+
         cost = [self.get_new_cost(self.nodes[i], node_new) for i in neighbor_index]
         cost_min_index = neighbor_index[int(np.argmin(cost))]
-        node_new.parent = self.nodes[cost_min_index]
+        if self.nodes[cost_min_index] is not node_new.parent:
+            self.set_parent(node_new, self.nodes[cost_min_index])
 
     def rewire(self, node_new, neighbor_index):
         for i in neighbor_index:
             node_neighbor = self.nodes[i]
 
             if self.compute_cost(node_neighbor) > self.get_new_cost(node_new, node_neighbor):
-                node_neighbor.parent = node_new
+                self.set_parent(node_neighbor, node_new)
+                node_neighbor.edge_checked = not self.lazy
 
     def get_new_cost(self, node_start, node_end):
         dist, _ = self.get_distance_and_angle(node_start, node_end)
@@ -4,6 +4,7 @@ from model.controllers.search_algorithm import SearchAlgorithm
 from model.geometry.segment import Segment
 from model.geometry.point import Point
 from model.controllers.graph import Node
+from model.controllers.nearest_neighbors import NearestNeighbors
 
 
 class SamplingBased(SearchAlgorithm):
@@ -16,13 +17,22 @@ class SamplingBased(SearchAlgorithm):
                  max_iterations=5000,
                  dynamic=False,
                  goal_sample_rate=0.05,
+                 lazy=False,
                  ):
 
         self.nodes = []
         self.edges = []
 
+        # Index of the points of the nodes, in the same order as the nodes list
+        self.nodes_index = NearestNeighbors()
+
         self.goal_sample_rate = goal_sample_rate
 
+        # In lazy mode the edges are checked for collisions only when they matter: the
+        # candidate parents of a node are checked until the first valid one, the rewired
+        # edges only when a path goes through them
+        self.lazy = lazy
+
         super().__init__(
             world_map,
             start,
@@ -40,12 +50,128 @@ class SamplingBased(SearchAlgorithm):
 
     @staticmethod
     def compute_cost(node):
+        # The cost to come is kept on the node as the tree changes
+        return node.cost
+
+    def set_nodes(self, nodes):
+        """
+        Replace the nodes of the tree, rebuilding the index
+        """
+        self.nodes = nodes
+        self.nodes_index.rebuild([node.point for node in nodes])
+        for index, node in enumerate(nodes):
+            node.index = index
+
+    def add_node(self, node):
+        """
+        Add the node to the tree, as a child of its parent
+        """
+        node.index = len(self.nodes)
+        self.nodes.append(node)
+        self.nodes_index.add(node.point)
+
+        if node.parent is not None:
+            node.parent.children.append(node)
+            node.cost = node.parent.cost + node.parent.point.distance(node.point)
+
+    def remove_nodes(self, nodes):
+        """
+        Remove the nodes from the tree. The last node takes the place of each removed one,
+        both in the list and in the index, so the index is not rebuilt
+        """
+        for node in nodes:
+            last = self.nodes.pop()
+            if last is not node:
+                self.nodes[node.index] = last
+                last.index = node.index
+            self.nodes_index.remove(node.index)
+            node.index = -1
+
+    def set_parent(self, node, parent):
+        """
+        Move the node, with its subtree, under another parent. The cost of all the
+        nodes in the subtree changes by the same amount
+        """
+        if node.parent is not None:
+            node.parent.children = [child for child in node.parent.children if child is not node]
+
+        node.parent = parent
+        parent.children.append(node)
+
+        delta = parent.cost + parent.point.distance(node.point) - node.cost
+        subtree = [node]
+        while subtree:
+            n = subtree.pop()
+            n.cost += delta
+            subtree.extend(n.children)
+
+    def nearest_neighbor(self, n):
+        """
+        Returns the node nearest to the one passed as argument
+        """
+        return self.nodes[self.nodes_index.nearest(n.point)]
+
+    def nodes_within(self, point, radius):
+        """
+        Returns the indices of the nodes within radius from the point, in increasing order
+        """
+        return self.nodes_index.within(point, radius)
+
+    def check_edge(self, start, end):
+        # Single edges checked one at a time, through the vectorized batch check
+        return self.check_collisions([start], [end])[0]
+
+    def choose_valid_parent(self, node, candidates):
+        """
+        Attach the node to the candidate it is cheapest to reach from with a collision free edge.
+        The candidates are checked in order of cost, up to the first valid one. Returns False if
+        none is valid
+        """
+        for candidate in sorted(candidates, key=lambda c: c.cost + c.point.distance(node.point)):
+            if not self.check_edge(candidate.point, node.point):
+                if candidate is not node.parent:
+                    self.set_parent(node, candidate)
+                node.edge_checked = True
+                return True
+        return False
+
+    def subtree(self, node):
+        """
+        Returns the node and all its descendants
+        """
+        subtree = [node]
+        i = 0
+        while i < len(subtree):
+            subtree.extend(subtree[i].children)
+            i += 1
+        return subtree
+
+    def verify_path(self, node, radius):
+        """
+        Check the edges not checked yet on the way from the node to the root. The nodes whose
+        edge collides are attached to another parent within radius, if there is one; if not,
+        the subtree of the node is cut off and removed from the tree (with the node the path
+        started from) and False is returned
+        """
         n = node
-        cost = 0.0
-        while n.parent:
-            cost += n.point.distance(n.parent.point)
+        while n.parent is not None:
+            if not n.edge_checked:
+                if self.check_edge(n.parent.point, n.point) and not self.repair_edge(n, radius):
+                    n.parent.children = [child for child in n.parent.children if child is not n]
+                    n.parent = None
+                    self.remove_nodes(self.subtree(n))
+                    return False
+                n.edge_checked = True
             n = n.parent
-        return cost
+        return True
+
+    def repair_edge(self, node, radius):
+        # The nodes in the subtree of the node can't be its parent
+        subtree = {id(n) for n in self.subtree(node)}
+
+        candidates = [self.nodes[i] for i in self.nodes_within(node.point, radius)
+                      if id(self.nodes[i]) not in subtree and self.nodes[i] is not node.parent]
+        return self.choose_valid_parent(node, candidates)
 
     def update_draw_list(self):
         # Overload the method to empty the draw_list first, getting rid of old segments.
@@ -68,7 +194,7 @@ class SamplingBased(SearchAlgorithm):
         return node.point.distance(self.world_map.goal)
 
     def reset(self):
-        self.nodes = []
+        self.set_nodes([])
         self.edges = []
         super().reset()
 
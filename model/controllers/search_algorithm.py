@@ -1,6 +1,9 @@
 import random
+import time
 from abc import ABC, abstractmethod
 
+import numpy as np
+
 from model.geometry.segment import Segment
 from model.geometry.polygon import Polygon
 
@@ -41,6 +44,10 @@ class SearchAlgorithm(ABC):
         # Number of steps to execute each time (default = 1)
         self.iterations_per_step = iterations_per_step
 
+        # If set, each step runs iterations until this many seconds are spent instead
+        # of a fixed number of iterations (see step)
+        self.time_budget = None
+
         # List of points from start (first) to goal (last)
         self.path = []
 
@@ -115,13 +122,57 @@ class SearchAlgorithm(ABC):
     def check_collision(self, start, end):
         """
         Given two points on the map, this implements the logic with which we check if
-        the second point is reachable by the first
+        the second point is reachable by the first. Results are cached on the map
+        """
+        cache = self.world_map.collision_cache
+        key = cache.key(start, end, self.margin)
+        collision = cache.get(key)
+
+        if collision is None:
+            collision = self.check_segment(start, end)
+            cache.put(key, collision)
+
+        return collision
+
+    def check_segment(self, start, end):
+        """
+        Uncached collision check of the segment from start to end against the map
         """
         line = Segment(start, end)
         buffer = Polygon.segment_buffer(line, left_margin=self.margin/2, right_margin=self.margin/2)
         intersecting_obstacles_ids = self.world_map.query_polygon(buffer)
         return len(intersecting_obstacles_ids) > 0
 
+    def check_collisions(self, starts, ends):
+        """
+        Batch version of check_collision. Given two lists of points of the same length,
+        returns a list of booleans that are True where the i-th end is not reachable
+        by the i-th start. The segments that are not cached are checked against the
+        map in one pass.
+        """
+        cache = self.world_map.collision_cache
+        keys = [cache.key(start, end, self.margin) for start, end in zip(starts, ends)]
+        collisions = [cache.get(key) for key in keys]
+
+        missing = [i for i, collision in enumerate(collisions) if collision is None]
+        if len(missing) > 0:
+            mask = self.check_segments(
+                np.array([(starts[i].x, starts[i].y) for i in missing], dtype=np.float64),
+                np.array([(ends[i].x, ends[i].y) for i in missing], dtype=np.float64)
+            )
+            for i, collision in zip(missing, mask.tolist()):
+                collisions[i] = collision
+                cache.put(keys[i], collision)
+
+        return collisions
+
+    def check_segments(self, starts, ends):
+        """
+        Uncached batch collision check of the segments, given as two (K, 2) arrays of
+        start and end points. Returns a boolean array of length K
+        """
+        return self.world_map.check_segments(starts, ends, self.margin)
+
     def has_path(self):
         """
         Return True if the algorithm has found a path. A path is a list of points
@@ -170,6 +221,18 @@ class SearchAlgorithm(ABC):
         """
         pass
 
+    def _keep_stepping(self, iterations, deadline):
+        """
+        Returns True if the step can run one more iteration: iterations_per_step of them
+        without a deadline, at least one and then as many as fit before the deadline otherwise.
+        Dynamic algorithms never run more than iterations_per_step, their iterations also
+        measure the time left to change the map
+        """
+
+        if deadline is None or (self.dynamic and iterations >= self.iterations_per_step):
+            return iterations < self.iterations_per_step
+        return iterations == 0 or time.perf_counter() < deadline
+
     def step(self):
         """
         Step the search algorithm. The step is performed even if there is nothing more to do.
@@ -181,7 +244,13 @@ class SearchAlgorithm(ABC):
         if not self.dynamic and self.map_changes_enabled:
             self.disable_map_changes()
 
-        for _ in range(self.iterations_per_step):
+        deadline = None
+        if self.time_budget is not None:
+            deadline = time.perf_counter() + self.time_budget
+
+        iterations = 0
+        while self._keep_stepping(iterations, deadline):
+            iterations += 1
 
             # If the algorithm has not yet terminated (while search time/space remaining)
             if self.can_run():
@@ -205,6 +274,10 @@ class SearchAlgorithm(ABC):
                     # Disable map changes: when the path is done, we can't change the environment
                     self.disable_map_changes()
 
+                # Nothing left to spend the time budget on
+                if deadline is not None:
+                    break
+
         # At this point we either have a path or an empty list
 
     def to_dict(self):
@@ -213,7 +286,8 @@ class SearchAlgorithm(ABC):
             "margin": self.margin,
             "current_iteration": self.current_iteration,
             "max_iterations": self.max_iterations,
-            "iterations_per_step": self.iterations_per_step
+            "iterations_per_step": self.iterations_per_step,
+            "time_budget": self.time_budget
         }
 
 
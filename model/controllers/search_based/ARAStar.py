@@ -0,0 +1,206 @@
+import heapq
+import math
+
+import numpy as np
+
+from model.geometry.point import Point
+
+from model.controllers.search_based_algorithm import SearchBased
+
+
+class ARAStar(SearchBased):
+    """
+    Anytime Repairing A* (ARA*). A weighted A* with the heuristic inflated by epsilon
+    finds a first path quickly, its cost within epsilon times the optimal one. Then
+    epsilon is decreased and the search goes on from where it stopped: the vertices
+    whose cost improved after they were expanded are kept in an inconsistent list and
+    only those are put back in the open set, so each new path repairs the previous one
+    instead of starting over. When epsilon reaches 1 the path is optimal on the lattice.
+    The search runs backwards, from the goal to the start, so that every vertex reached
+    knows its way to the goal. Each improved path is published right away, starting from
+    the waypoint the robot is currently heading to, and the robot never has to go back.
+    """
+
+    def __init__(self,
+                 world_map,
+                 start=Point(0, 0),
+                 margin=0.2,
+                 iterations_per_step=1,
+                 max_iterations=5000,
+                 discretization_step=0.2,
+                 initial_epsilon=2.5,
+                 epsilon_decrease=0.5
+                 ):
+
+        if initial_epsilon < 1:
+            raise ValueError(f'Invalid initial epsilon: {initial_epsilon}')
+
+        if epsilon_decrease <= 0:
+            raise ValueError(f'Invalid epsilon decrease: {epsilon_decrease}')
+
+        self.initial_epsilon = initial_epsilon
+        self.epsilon_decrease = epsilon_decrease
+
+        # Inflation of the heuristic of the current search, the path published last is
+        # at most published_epsilon times longer than the optimal one
+        self.epsilon = initial_epsilon
+        self.published_epsilon = math.inf
+        self.done = False
+
+        super().__init__(
+            world_map,
+            start,
+            margin=margin,
+            iterations_per_step=iterations_per_step,
+            max_iterations=max_iterations,
+            dynamic=False,
+            discretization_step=discretization_step
+        )
+
+    def pre_search(self):
+
+        self.init_lattice()
+
+        # The search starts from the vertex nearest to the goal and ends in the vertex
+        # nearest to the start; the edges are traced from the goal and the start themselves
+        self.start_vertex = self.nearest_vertex(self.start)
+        self.goal_vertex = self.nearest_vertex(self.world_map.goal)
+
+        # Cost to the goal and next vertex towards it
+        self.g_score = np.full(self.lattice_size, math.inf)
+        self.parents = np.full(self.lattice_size, -1, dtype=np.int64)
+
+        # Open vertices and the keys they are queued with, entries of the heap that don't match are outdated
+        self.open = np.zeros(self.lattice_size, dtype=bool)
+        self.open_keys = np.zeros(self.lattice_size)
+        self.closed_set = np.zeros(self.lattice_size, dtype=bool)
+        self.inconsistent = np.zeros(self.lattice_size, dtype=bool)
+        self.open_set = []
+
+        self.epsilon = self.initial_epsilon
+        self.published_epsilon = math.inf
+        self.done = False
+
+        self.g_score[self.goal_vertex] = 0
+        self.queue(self.goal_vertex)
+
+    def point_of(self, vertex):
+        if vertex == self.start_vertex:
+            return self.start
+        if vertex == self.goal_vertex:
+            return self.world_map.goal
+        return self.vertex_point(vertex)
+
+    def heuristic(self, point):
+        return point.distance(self.start)
+
+    def queue(self, vertex):
+        key = self.g_score[vertex] + self.epsilon * self.heuristic(self.point_of(vertex))
+        self.open[vertex] = True
+        self.open_keys[vertex] = key
+        heapq.heappush(self.open_set, (key, vertex))
+
+    def top_key(self):
+        """
+        Returns the smallest key in the open set, dropping the outdated entries on top
+        """
+
+        while self.open_set:
+            key, vertex = self.open_set[0]
+            if self.open[vertex] and self.open_keys[vertex] == key:
+                return key
+            heapq.heappop(self.open_set)
+
+        return math.inf
+
+    def can_run(self):
+        return not self.done and self.current_iteration < self.max_iterations
+
+    def step_search(self):
+
+        # The current search is over when no open vertex can lead to a better path to the start
+        top_key = self.top_key()
+        if top_key >= self.g_score[self.start_vertex]:
+
+            if self.g_score[self.start_vertex] < math.inf:
+                self.publish_path()
+
+            if self.epsilon <= 1 or top_key == math.inf:
+                self.done = True
+            else:
+                self.decrease_epsilon()
+
+            return
+
+        _, current_vertex = heapq.heappop(self.open_set)
+        self.open[current_vertex] = False
+        self.closed_set[current_vertex] = True
+        current_point = self.point_of(current_vertex)
+
+        adjacent = self.adjacent_vertices(current_vertex)
+        adjacent_points = [self.point_of(vertex) for vertex in adjacent]
+        collisions = self.check_collisions([current_point] * len(adjacent), adjacent_points)
+
+        current_cost = self.g_score[current_vertex]
+        for vertex, point, collision in zip(adjacent, adjacent_points, collisions):
+
+            if collision:
+                continue
+
+            new_cost = current_cost + current_point.distance(point)
+            if new_cost < self.g_score[vertex]:
+
+                # Update the draw list the first time the vertex is reached
+                if self.parents[vertex] < 0 and vertex != self.goal_vertex:
+                    self.draw_list.append(self.get_view(point))
+
+                self.g_score[vertex] = new_cost
+                self.parents[vertex] = current_vertex
+
+                # Vertices already expanded in this search are only expanded again in the next one
+                if self.closed_set[vertex]:
+                    self.inconsistent[vertex] = True
+                else:
+                    self.queue(vertex)
+
+    def decrease_epsilon(self):
+        """
+        Start a new search with a smaller epsilon, from the open and the inconsistent vertices
+        """
+
+        self.epsilon = max(1.0, self.epsilon - self.epsilon_decrease)
+
+        self.open |= self.inconsistent
+        self.inconsistent[:] = False
+        self.closed_set[:] = False
+
+        self.open_set = []
+        for vertex in np.flatnonzero(self.open).tolist():
+            self.queue(vertex)
+
+    def publish_path(self):
+        """
+        Publish the path from the waypoint the robot is heading to, or from the start if the robot
+        has not moved yet, to the goal. The waypoint keeps the previous path if it has not been reached
+        """
+
+        source = self.start_vertex
+        if self.path and self.path[0] != self.start:
+            waypoint = self.nearest_vertex(self.path[0])
+            if self.path[0] != self.vertex_point(waypoint) or self.g_score[waypoint] == math.inf:
+                return
+            source = waypoint
+
+        path = []
+        vertex = source
+        while vertex >= 0:
+            path.append(self.point_of(vertex))
+            vertex = self.parents[vertex]
+
+        self.path = path
+        self.published_epsilon = self.epsilon
+
+    def post_search(self):
+        # Publish the best path found if the iterations expired before the optimal one
+        if self.published_epsilon > self.epsilon and self.g_score[self.start_vertex] < math.inf:
+            self.publish_path()
@@ -1,26 +1,39 @@
-from queue import PriorityQueue
+import heapq
+import math
+
+import numpy as np
 
 from model.geometry.point import Point
 
 from model.controllers.search_based_algorithm import SearchBased
-from model.controllers.graph import Node
 
 
 class AStar(SearchBased):
-
-    def __init__(self, 
-                 world_map, 
-                 start=Point(0, 0), 
-                 margin=0.2, 
+    """
+    A* on the lattice of the map. Vertices are identified by the integer ids of the
+    lattice, so g-scores, parents and the closed set are flat arrays. The open set is
+    a binary heap with lazy deletion: when a better path to a vertex is found the
+    vertex is pushed again and the outdated entries are skipped when popped. Unlike
+    the get_neighbors based algorithms, a vertex first reached through a worse path
+    is improved, so the path is optimal on the lattice.
+    """
+
+    def __init__(self,
+                 world_map,
+                 start=Point(0, 0),
+                 margin=0.2,
                  iterations_per_step=1,
                  max_iterations=5000,
                  discretization_step=0.2
                  ):
-        
+
+        # Vertex whose cell contains the goal, once expanded
+        self.goal_vertex = None
+
         super().__init__(
-            world_map, 
-            start, 
-            margin=margin, 
+            world_map,
+            start,
+            margin=margin,
             iterations_per_step=iterations_per_step,
             max_iterations=max_iterations,
             dynamic=False,
@@ -29,53 +42,98 @@ class AStar(SearchBased):
 
     def pre_search(self):
 
-        self.open_set = PriorityQueue()
+        self.init_lattice()
+
+        self.g_score = np.full(self.lattice_size, math.inf)
+        self.parents = np.full(self.lattice_size, -1, dtype=np.int64)
+        self.closed_set = np.zeros(self.lattice_size, dtype=bool)
 
-        start_node = Node(self.start, cost=0, heuristic=self.heuristic(self.start))
+        # The search starts from the vertex nearest to the start, but the first edges
+        # are traced from the start itself
+        self.start_vertex = self.nearest_vertex(self.start)
+        self.g_score[self.start_vertex] = 0
+        self.goal_vertex = None
 
-        self.open_set.put((start_node.cost + start_node.heuristic, start_node))  # Priority queue with f(n) as priority
+        # Heap of (f, h, vertex) entries, ties are broken in favor of the vertex nearest to the goal
+        start_heuristic = self.heuristic(self.start)
+        self.open_set = [(start_heuristic, start_heuristic, self.start_vertex)]
 
     def heuristic(self, point):
         return point.distance(self.world_map.goal)
 
+    def point_of(self, vertex):
+        if vertex == self.start_vertex:
+            return self.start
+        return self.vertex_point(vertex)
+
     def can_run(self):
-        # Termination condition is that the highest priority element (nearest to the goal) is the goal itself
-        return not self.open_set.empty() and not self.cell_contains(self.open_set.queue[0][1].point, self.world_map.goal)
+        # Termination condition is that the vertex expanded last contains the goal or there is nothing left to expand
+        return self.goal_vertex is None and len(self.open_set) > 0
+
+    def pop_vertex(self):
+        """
+        Pop the open vertex with the lowest f-score, skipping the outdated entries.
+        Returns None if there are no open vertices left
+        """
+
+        while self.open_set:
+            _, _, vertex = heapq.heappop(self.open_set)
+            if not self.closed_set[vertex]:
+                return vertex
+
+        return None
 
     def step_search(self):
 
-        current_node = self.open_set.get()[1]
+        current_vertex = self.pop_vertex()
+        if current_vertex is None:
+            return
 
-        """
-        if current_node.point == self.world_map.goal:
-            # Goal reached, reconstruct the path
-            self.reconstruct_path(current_node)
+        self.closed_set[current_vertex] = True
+        current_point = self.point_of(current_vertex)
+
+        if self.cell_contains(current_point, self.world_map.goal):
+            self.goal_vertex = current_vertex
             return
-        """
 
-        # Expand the current node and add its neighbors to the frontier
-        neighbors = self.get_neighbors(current_node.point)
-        for neighbor in neighbors:
-            new_cost = current_node.cost + current_node.point.distance(neighbor)
-            new_heuristic = self.heuristic(neighbor)
-            new_node = Node(neighbor, parent=current_node, cost=new_cost, heuristic=new_heuristic)
-            priority = new_cost + new_heuristic
-            self.open_set.put((priority, new_node))
+        # Check all the edges towards the vertices that are not closed yet at once
+        candidates = [vertex for vertex in self.adjacent_vertices(current_vertex) if not self.closed_set[vertex]]
+        candidate_points = [self.point_of(vertex) for vertex in candidates]
+        collisions = self.check_collisions([current_point] * len(candidates), candidate_points)
+
+        current_cost = self.g_score[current_vertex]
+        for vertex, point, collision in zip(candidates, candidate_points, collisions):
+
+            if collision:
+                continue
+
+            new_cost = current_cost + current_point.distance(point)
+            if new_cost < self.g_score[vertex]:
 
-            # Update draw list
-            self.draw_list.append(self.get_view(neighbor))
+                # Update the draw list the first time the vertex is reached
+                if self.parents[vertex] < 0:
+                    self.draw_list.append(self.get_view(point))
+
+                self.g_score[vertex] = new_cost
+                self.parents[vertex] = current_vertex
+
+                new_heuristic = self.heuristic(point)
+                heapq.heappush(self.open_set, (new_cost + new_heuristic, new_heuristic, vertex))
 
     def post_search(self):
-        self.reconstruct_path(self.open_set.queue[0][1])
+        if self.goal_vertex is not None:
+            self.reconstruct_path(self.goal_vertex)
 
-    def reconstruct_path(self, goal_node):
+    def reconstruct_path(self, goal_vertex):
         # Reconstruct the path by backtracking through the parent pointers
         self.path = []
-        current_node = goal_node
+        vertex = goal_vertex
 
-        # Change the point from the center of the cell that contains the goal to the goal itself
-        current_node.point = self.world_map.goal
+        while vertex >= 0:
+            self.path.append(self.point_of(vertex))
+            vertex = self.parents[vertex]
 
-        while current_node is not None:
-            self.path.insert(0, current_node.point)
-            current_node = current_node.parent
+        self.path.reverse()
+
+        # Change the point from the center of the cell that contains the goal to the goal itself
+        self.path[-1] = self.world_map.goal
@@ -0,0 +1,192 @@
+import heapq
+import math
+
+import numpy as np
+
+from model.geometry.point import Point
+
+from model.controllers.search_based_algorithm import SearchBased
+
+
+class BidirectionalAStar(SearchBased):
+    """
+    Bidirectional A* on the lattice of the map: a forward search from the start and a
+    backward search from the goal expand a vertex at a time, each time the one with the
+    smaller open set, until the best path found through a vertex reached by both can't
+    be improved anymore. When one side is walled in, it runs out of vertices before the
+    other one has explored much and the search ends there.
+    The two searches use the average of the distances to the goal and from the start
+    as potentials, p(v) = (h_goal(v) - h_start(v)) / 2 forward and -p(v) backward,
+    measured with the octile distance, the length of the shortest path on the empty
+    lattice: an average of euclidean distances would be too loose for the search to
+    stay focused on the way between start and goal.
+    This way both are Dijkstra on the same reduced edge costs and the search can stop
+    as soon as the smallest keys of the two open sets add up to the cost of the best
+    path found so far. Each side stops at about half the distance between start and goal.
+    A vertex already expanded by the other side is not expanded again, the best path
+    through it is already known, and vertices that can't be on a path shorter than the
+    best one found so far (by the euclidean distance to the other end) are not queued.
+    """
+
+    def __init__(self,
+                 world_map,
+                 start=Point(0, 0),
+                 margin=0.2,
+                 iterations_per_step=1,
+                 max_iterations=5000,
+                 discretization_step=0.2
+                 ):
+
+        # Vertex through which the best path found so far goes, and its cost
+        self.meeting_vertex = None
+        self.best_cost = math.inf
+        self.done = False
+
+        super().__init__(
+            world_map,
+            start,
+            margin=margin,
+            iterations_per_step=iterations_per_step,
+            max_iterations=max_iterations,
+            dynamic=False,
+            discretization_step=discretization_step
+        )
+
+    def pre_search(self):
+
+        self.init_lattice()
+
+        # The two searches start from the vertices nearest to the start and to the goal,
+        # but their first edges are traced from the start and the goal themselves
+        self.start_vertex = self.nearest_vertex(self.start)
+        self.goal_vertex = self.nearest_vertex(self.world_map.goal)
+
+        # Forward (0) and backward (1) searches
+        self.g_scores = [np.full(self.lattice_size, math.inf) for _ in range(2)]
+        self.parents = [np.full(self.lattice_size, -1, dtype=np.int64) for _ in range(2)]
+        self.closed_sets = [np.zeros(self.lattice_size, dtype=bool) for _ in range(2)]
+
+        self.g_scores[0][self.start_vertex] = 0
+        self.g_scores[1][self.goal_vertex] = 0
+
+        # Heaps of (key, vertex) entries
+        self.open_sets = [[(self.potential(self.start_vertex, 0), self.start_vertex)],
+                          [(self.potential(self.goal_vertex, 1), self.goal_vertex)]]
+
+        self.meeting_vertex = None
+        self.best_cost = math.inf
+        self.done = False
+
+        # Start and goal in the same cell
+        if self.start_vertex == self.goal_vertex:
+            self.meeting_vertex = self.start_vertex
+            self.best_cost = 0
+
+    def point_of(self, vertex):
+        if vertex == self.start_vertex:
+            return self.start
+        if vertex == self.goal_vertex:
+            return self.world_map.goal
+        return self.vertex_point(vertex)
+
+    @staticmethod
+    def octile_distance(point, other):
+        dx = abs(point.x - other.x)
+        dy = abs(point.y - other.y)
+        return max(dx, dy) + (math.sqrt(2) - 1) * min(dx, dy)
+
+    def potential(self, vertex, direction):
+        """
+        Average potential of the vertex for the forward (0) or backward (1) search
+        """
+        point = self.point_of(vertex)
+        potential = (self.octile_distance(point, self.world_map.goal) - self.octile_distance(point, self.start)) / 2
+        return potential if direction == 0 else -potential
+
+    def top_key(self, direction):
+        """
+        Returns the smallest key in the open set of the direction, dropping the outdated entries on top
+        """
+
+        open_set = self.open_sets[direction]
+        while open_set and self.closed_sets[direction][open_set[0][1]]:
+            heapq.heappop(open_set)
+
+        return open_set[0][0] if open_set else math.inf
+
+    def can_run(self):
+        return not self.done
+
+    def step_search(self):
+
+        top_forward, top_backward = self.top_key(0), self.top_key(1)
+
+        # No path through the unexpanded vertices can be cheaper than the best one found so far
+        if top_forward + top_backward >= self.best_cost:
+            self.done = True
+            return
+
+        # Expand from the side with the smaller open set
+        direction = 0 if len(self.open_sets[0]) <= len(self.open_sets[1]) else 1
+
+        g_score, parents, closed_set = self.g_scores[direction], self.parents[direction], self.closed_sets[direction]
+        other_g_score = self.g_scores[1 - direction]
+
+        _, current_vertex = heapq.heappop(self.open_sets[direction])
+        closed_set[current_vertex] = True
+
+        # The best path through a vertex the other side has expanded is already known
+        if self.closed_sets[1 - direction][current_vertex]:
+            return
+
+        current_point = self.point_of(current_vertex)
+        target = self.world_map.goal if direction == 0 else self.start
+
+        # Check all the edges towards the vertices that are not closed yet at once
+        candidates = [vertex for vertex in self.adjacent_vertices(current_vertex) if not closed_set[vertex]]
+        candidate_points = [self.point_of(vertex) for vertex in candidates]
+        collisions = self.check_collisions([current_point] * len(candidates), candidate_points)
+
+        current_cost = g_score[current_vertex]
+        for vertex, point, collision in zip(candidates, candidate_points, collisions):
+
+            if collision:
+                continue
+
+            new_cost = current_cost + current_point.distance(point)
+            if new_cost < g_score[vertex] and new_cost + point.distance(target) < self.best_cost:
+
+                # Update the draw list the first time the vertex is reached
+                if parents[vertex] < 0 and self.g_scores[1 - direction][vertex] == math.inf:
+                    self.draw_list.append(self.get_view(point))
+
+                g_score[vertex] = new_cost
+                parents[vertex] = current_vertex
+                heapq.heappush(self.open_sets[direction], (new_cost + self.potential(vertex, direction), vertex))
+
+                # The vertex has been reached from the other side too
+                if new_cost + other_g_score[vertex] < self.best_cost:
+                    self.best_cost = new_cost + other_g_score[vertex]
+                    self.meeting_vertex = vertex
+
+    def post_search(self):
+        if self.meeting_vertex is not None:
+            self.reconstruct_path(self.meeting_vertex)
+
+    def reconstruct_path(self, meeting_vertex):
+        # Backtrack from the meeting vertex to the start, then follow the backward parents to the goal
+        self.path = []
+        vertex = meeting_vertex
+        while vertex >= 0:
+            self.path.append(self.point_of(vertex))
+            vertex = self.parents[0][vertex]
+
+        self.path.reverse()
+
+        vertex = self.parents[1][meeting_vertex]
+        while vertex >= 0:
+            self.path.append(self.point_of(vertex))
+            vertex = self.parents[1][vertex]
+
+        if self.path[-1] != self.world_map.goal:
+            self.path.append(self.world_map.goal)
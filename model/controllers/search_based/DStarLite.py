@@ -0,0 +1,282 @@
+import heapq
+import math
+
+import numpy as np
+
+from model.controllers.search_based_algorithm import SearchBased
+
+from model.geometry.segment import Segment
+from model.geometry.point import Point
+
+
+class DStarLite(SearchBased):
+    """
+    D* Lite searches backwards from the goal towards the start keeping, for each vertex
+    of the lattice, its cost-to-goal g and a one-step lookahead rhs. Vertices whose g
+    and rhs differ are inconsistent and wait in a priority queue keyed on (k1, k2).
+    Once the start is consistent the path is read by following the cheapest successors.
+    When the map changes only the vertices near the changed regions are updated and
+    the search goes on from there, repairing the previous solution instead of
+    starting over.
+    Vertices are the integer ids of the lattice, g and rhs are flat arrays and the
+    priority queue is a binary heap with lazy deletion. The start is the pose of the
+    robot when the search began and stays fixed until the world is reset (the robot
+    only starts following the path once the iterations are over), so the key modifier
+    of the original formulation is always 0.
+    """
+
+    def __init__(self,
+                 world_map,
+                 start=Point(0, 0),
+                 margin=0.2,
+                 iterations_per_step=4,
+                 max_iterations=5000,
+                 discretization_step=0.2,
+                 ):
+
+        self.start_vertex = None
+        self.goal_vertex = None
+
+        # True while the search has to make the start consistent (first
+        # planning or repair after a change in the map)
+        self.searching = True
+
+        # Whenever we have a path and self.has_path() returns True, the robot
+        # will start moving towards the goal. We want instead the robot to move
+        # only when the iterations are expired so we can add obstacles to the map.
+        # For this reason we will store a temporary path and transfer all the points
+        # from the temp path to the real one only once the iterations are expired.
+        self.temp_path = []
+
+        # Version of the map we last synced with
+        self.map_version = world_map.version
+
+        super().__init__(
+            world_map,
+            start,
+            margin=margin,
+            iterations_per_step=iterations_per_step,
+            max_iterations=max_iterations,
+            dynamic=True,
+            discretization_step=discretization_step
+        )
+
+    def pre_search(self):
+
+        self.init_lattice()
+
+        self.g_score = np.full(self.lattice_size, math.inf)
+        self.rhs = np.full(self.lattice_size, math.inf)
+
+        # Keys the vertices are queued with, entries of the heap that don't match are outdated
+        self.queued = np.zeros(self.lattice_size, dtype=bool)
+        self.queued_keys = np.zeros((self.lattice_size, 2))
+        self.open_set = []
+
+        self.start_vertex = self.nearest_vertex(self.start)
+        self.goal_vertex = self.nearest_vertex(self.world_map.goal)
+        self.start_point = self.vertex_point(self.start_vertex)
+
+        self.searching = True
+        self.temp_path = []
+        self.map_version = self.world_map.version
+
+        self.rhs[self.goal_vertex] = 0
+        self.queue_update(self.goal_vertex)
+
+    def can_run(self):
+        # The algorithm keeps reacting to the changes until the iterations are over
+        return self.current_iteration < self.max_iterations
+
+    def heuristic(self, point):
+        return point.distance(self.start_point)
+
+    def calculate_key(self, vertex):
+        best = min(self.g_score[vertex], self.rhs[vertex])
+        return best + self.heuristic(self.vertex_point(vertex)), best
+
+    def queue_update(self, vertex):
+        """
+        Queue the vertex with its current key if it is inconsistent, dequeue it otherwise
+        """
+
+        if self.g_score[vertex] != self.rhs[vertex]:
+            key = self.calculate_key(vertex)
+            self.queued[vertex] = True
+            self.queued_keys[vertex] = key
+            heapq.heappush(self.open_set, (key[0], key[1], vertex))
+        else:
+            self.queued[vertex] = False
+
+    def top_key(self):
+        """
+        Returns the smallest key in the queue, dropping the outdated entries on top
+        """
+
+        while self.open_set:
+            k1, k2, vertex = self.open_set[0]
+            if self.queued[vertex] and self.queued_keys[vertex, 0] == k1 and self.queued_keys[vertex, 1] == k2:
+                return k1, k2
+            heapq.heappop(self.open_set)
+
+        return math.inf, math.inf
+
+    def edge_costs(self, vertex):
+        """
+        Returns the adjacent vertices and the costs of the edges towards them; the cost
+        of the edges that collide with an obstacle is infinite
+        """
+
+        point = self.vertex_point(vertex)
+        adjacent = self.adjacent_vertices(vertex)
+        adjacent_points = [self.vertex_point(other) for other in adjacent]
+        collisions = self.check_collisions([point] * len(adjacent), adjacent_points)
+
+        return [(other, math.inf if collision else point.distance(other_point))
+                for other, other_point, collision in zip(adjacent, adjacent_points, collisions)]
+
+    def update_rhs(self, vertex):
+        """
+        Recompute the lookahead of the vertex from its successors
+        """
+
+        if vertex != self.goal_vertex:
+            self.rhs[vertex] = min((cost + self.g_score[other] for other, cost in self.edge_costs(vertex)),
+                                   default=math.inf)
+        self.queue_update(vertex)
+
+    def is_consistent(self):
+        return (self.top_key() >= self.calculate_key(self.start_vertex) and
+                self.rhs[self.start_vertex] == self.g_score[self.start_vertex])
+
+    def expand(self):
+        """
+        Process the vertex with the smallest key
+        """
+
+        k_old = self.top_key()
+        _, _, vertex = heapq.heappop(self.open_set)
+        self.queued[vertex] = False
+
+        k_new = self.calculate_key(vertex)
+        if k_old < k_new:
+            self.queued[vertex] = True
+            self.queued_keys[vertex] = k_new
+            heapq.heappush(self.open_set, (k_new[0], k_new[1], vertex))
+
+        elif self.g_score[vertex] > self.rhs[vertex]:
+
+            # Overconsistent: the vertex got cheaper, its predecessors might get cheaper through it
+            self.g_score[vertex] = self.rhs[vertex]
+            for other, cost in self.edge_costs(vertex):
+                if other != self.goal_vertex and cost + self.g_score[vertex] < self.rhs[other]:
+                    self.rhs[other] = cost + self.g_score[vertex]
+                    self.queue_update(other)
+
+        else:
+
+            # Underconsistent: the predecessors that relied on the vertex have to look elsewhere
+            g_old = self.g_score[vertex]
+            self.g_score[vertex] = math.inf
+            for other, cost in self.edge_costs(vertex):
+                if self.rhs[other] == cost + g_old:
+                    self.update_rhs(other)
+            self.update_rhs(vertex)
+
+    def extract_path(self):
+        """
+        Follow the cheapest successors from the start to the goal
+        """
+
+        self.temp_path = []
+        if self.g_score[self.start_vertex] == math.inf:
+            return
+
+        path = [self.start]
+        if self.start_point != self.start:
+            path.append(self.start_point)
+
+        vertex = self.start_vertex
+        for _ in range(self.lattice_size):
+
+            if vertex == self.goal_vertex:
+                path[-1] = self.world_map.goal
+                self.temp_path = path
+                return
+
+            vertex, _ = min(self.edge_costs(vertex), key=lambda edge: edge[1] + self.g_score[edge[0]])
+            path.append(self.vertex_point(vertex))
+
+    def affected_vertices(self, bounds):
+        """
+        Returns the vertices that have an edge overlapping the bounds grown by the margin
+        """
+
+        step = self.discretization_step
+        min_x, min_y, max_x, max_y = bounds
+        padding = self.margin / 2 + step
+
+        min_i = max(self.lattice_min_i, math.ceil((min_x - padding) / step))
+        min_j = max(self.lattice_min_j, math.ceil((min_y - padding) / step))
+        max_i = min(self.lattice_min_i + self.lattice_width - 1, math.floor((max_x + padding) / step))
+        max_j = min(self.lattice_min_j + self.lattice_height - 1, math.floor((max_y + padding) / step))
+
+        return [self.vertex_id(i, j) for i in range(min_i, max_i + 1) for j in range(min_j, max_j + 1)]
+
+    def step_search(self):
+
+        if self.searching:
+
+            # At every iteration, ensure map changes are not enabled
+            self.world_map.disable()
+
+            if not self.is_consistent():
+                self.expand()
+            else:
+                self.extract_path()
+                self.searching = False
+
+        # We have the path, we start checking for map updates
+        else:
+
+            self.world_map.enable()  # Ensure map changes are enabled
+
+            # Changes occurred since the last sync
+            changes = self.world_map.changes_since(self.map_version)
+            if len(changes) > 0:
+
+                # A new goal or a brand new map require a new search
+                if (any(change.op == 'reset' for change in changes) or
+                        self.nearest_vertex(self.world_map.goal) != self.goal_vertex):
+                    self.pre_search()
+
+                else:
+
+                    # Update the version of the map we synced with
+                    self.map_version = self.world_map.version
+
+                    # Costs changed only around the changed regions (the collision
+                    # cache has already been invalidated there by the map)
+                    affected = set()
+                    for change in changes:
+                        affected.update(self.affected_vertices(change.bounds))
+                    for vertex in affected:
+                        self.update_rhs(vertex)
+
+                    self.searching = True
+
+            # Nothing to redraw while the search is idle
+            else:
+                return
+
+        # Update drawing list
+        self.update_draw_list()
+
+    def post_search(self):
+        self.path = list(self.temp_path)
+
+    def update_draw_list(self):
+        # Draw the queued vertices and the temp path, if it has been found
+        self.draw_list = [self.get_view(self.vertex_point(vertex)) for vertex in np.flatnonzero(self.queued)]
+        for i in range(1, len(self.temp_path)):
+            self.draw_list.append(Segment(self.temp_path[i - 1], self.temp_path[i]))
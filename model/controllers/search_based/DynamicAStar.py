@@ -91,9 +91,9 @@ class DynamicAStar(SearchBased):
         # from the temp path to the real one only once the iterations are expired.
         self.temp_path = None
 
-        # Number of obstacles. This will be used to check if something has
-        # changed and we need to trim the tree/update the path
-        self.num_obstacles = len(world_map.obstacles)
+        # Version of the map we last synced with. This will be used to get the
+        # changes that occurred since then and update the path
+        self.map_version = world_map.version
 
         # We already have open and visited sets (open_set, closed_set respectively)
         # in the interface. The open set contains nodes that are candidates for
@@ -146,9 +146,8 @@ class DynamicAStar(SearchBased):
         self.replanning_current_node = None
         self.cost_updated = False
 
-        # Number of obstacles. This will be used to check if something has
-        # changed and we need to trim the tree/update the path
-        self.num_obstacles = len(self.world_map.obstacles)
+        # Version of the map we last synced with
+        self.map_version = self.world_map.version
 
         self.temp_path = []
 
@@ -251,9 +250,21 @@ class DynamicAStar(SearchBased):
                             neighbors.add(neighbor_node)
         return neighbors
 
-    def is_temp_path_invalid(self):
+    def is_temp_path_invalid(self, changes=None):
+        """
+        Check the segments of the temp path. If a list of map changes is provided,
+        only the segments that overlap the changed regions are checked
+        """
+
         for i in range(1, len(self.temp_path)):
-            if self.check_collision(self.temp_path[i - 1], self.temp_path[i]):
+            start, end = self.temp_path[i - 1], self.temp_path[i]
+
+            if changes is not None:
+                bounds = (min(start.x, end.x), min(start.y, end.y), max(start.x, end.x), max(start.y, end.y))
+                if not any(change.overlaps(bounds, self.margin / 2) for change in changes):
+                    continue
+
+            if self.check_collision(start, end):
                 return True
         return False
 
@@ -281,14 +292,19 @@ class DynamicAStar(SearchBased):
 
             self.world_map.enable()  # Ensure map changes are enabled
 
-            # Changes occurred (different number of obstacles)
-            if self.num_obstacles != len(self.world_map.obstacles):
+            # Changes occurred since the last sync
+            changes = self.world_map.changes_since(self.map_version)
+            if len(changes) > 0:
+
+                # Update the version of the map we synced with
+                self.map_version = self.world_map.version
 
-                # Update the number of obstacles in the map
-                self.num_obstacles = len(self.world_map.obstacles)
+                # Removing obstacles can't invalidate the path, only check the
+                # regions where obstacles have been added (or replaced)
+                regions = [change for change in changes if change.op != 'remove']
 
                 # Check if the path is invalid
-                if self.is_temp_path_invalid():
+                if len(regions) > 0 and self.is_temp_path_invalid(regions):
                     self.algorithm_step = Step.REPLANNING
                     self.closed_set = set()
                     self.temp_path = []
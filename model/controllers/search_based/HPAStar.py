@@ -0,0 +1,413 @@
+import heapq
+import math
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from model.geometry.point import Point
+
+from model.controllers.search_algorithm import SearchAlgorithm
+from model.controllers.search_based_algorithm import SearchBased
+
+
+# Directions of the moves on the lattice, counterclockwise starting from east. The
+# opposite of direction k is (k + 4) % 8, even directions are straight moves
+DIRECTIONS = [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)]
+
+
+class HPAStar(SearchBased):
+    """
+    Hierarchical Path-finding A* (HPA*). The lattice is partitioned in square clusters
+    of cluster_size x cluster_size vertices. Along the border between two adjacent
+    clusters, each run of free crossing edges is an entrance and gets one (or, if long,
+    two) transitions. The abstract graph has the transitions as vertices, the crossing
+    edges between them and, inside each cluster, the shortest paths between its
+    transitions. The search runs on the abstract graph and only the clusters on the
+    abstract path are then refined on the lattice, so nothing is ever allocated for the
+    whole map: memory and time grow with the region the search explores.
+    The abstract graph is built lazily, a cluster at a time, and is kept across resets:
+    on each new search only the clusters near the obstacles that changed since the
+    version of the map it was built on are dropped.
+    """
+
+    def __init__(self,
+                 world_map,
+                 start=Point(0, 0),
+                 margin=0.2,
+                 iterations_per_step=1,
+                 max_iterations=5000,
+                 discretization_step=0.2,
+                 cluster_size=10
+                 ):
+
+        if cluster_size < 2:
+            raise ValueError(f'Invalid cluster size: {cluster_size}')
+
+        # Side (in vertices) of the clusters
+        self.cluster_size = cluster_size
+
+        # Cached layers of the abstract graph:
+        # - (ci, cj) -> sparse graph of the free edges between the vertices of the cluster
+        # - (ci, cj, axis) -> list of (vertex, vertex) transitions from cluster (ci, cj) to the next one along the axis
+        # - (ci, cj) -> {transition: [(vertex, cost), ...]} edges of the transitions of the cluster
+        self.cluster_graphs = {}
+        self.entrances = {}
+        self.abstract_edges = {}
+
+        # Version of the map and lattice the cache has been built on
+        self.map_version = None
+        self.cached_lattice = None
+
+        self.goal_vertex = None
+        self.goal_reached = False
+
+        super().__init__(
+            world_map,
+            start,
+            margin=margin,
+            iterations_per_step=iterations_per_step,
+            max_iterations=max_iterations,
+            dynamic=False,
+            discretization_step=discretization_step
+        )
+
+    def check_segments(self, starts, ends):
+        # The occupancy grid of the map would take memory proportional to its area, the
+        # edges are few and checked a cluster at a time
+        return SearchAlgorithm.check_segments(self, starts, ends)
+
+    def check_segment(self, start, end):
+        return SearchAlgorithm.check_segment(self, start, end)
+
+    # ---------------------------------- Clusters -------------------------------- #
+
+    def cluster_of(self, vertex):
+        i, j = divmod(vertex, self.lattice_height)
+        return i // self.cluster_size, j // self.cluster_size
+
+    def cluster_range(self, cluster):
+        """
+        Returns the range (min_i, min_j, max_i, max_j), inclusive, of the lattice indices of the cluster
+        """
+
+        ci, cj = cluster
+        return (ci * self.cluster_size, cj * self.cluster_size,
+                min((ci + 1) * self.cluster_size, self.lattice_width) - 1,
+                min((cj + 1) * self.cluster_size, self.lattice_height) - 1)
+
+    def cluster_bounds(self, cluster):
+        """
+        Returns the region of the map whose obstacles can block the edges of the cluster,
+        including the ones crossing its borders
+        """
+
+        min_i, min_j, max_i, max_j = self.cluster_range(cluster)
+        step = self.discretization_step
+        padding = step + self.margin / 2
+        return ((min_i + self.lattice_min_i) * step - padding, (min_j + self.lattice_min_j) * step - padding,
+                (max_i + self.lattice_min_i) * step + padding, (max_j + self.lattice_min_j) * step + padding)
+
+    def lattice_points(self, i, j):
+        """
+        Map coordinates of the lattice indices, given as arrays
+        """
+        return np.stack(((i + self.lattice_min_i) * self.discretization_step,
+                         (j + self.lattice_min_j) * self.discretization_step), axis=1)
+
+    def local_index(self, vertex):
+        """
+        Index of the vertex among the vertices of its cluster
+        """
+
+        i, j = divmod(vertex, self.lattice_height)
+        min_i, min_j, _, max_j = self.cluster_range(self.cluster_of(vertex))
+        return (i - min_i) * (max_j - min_j + 1) + (j - min_j)
+
+    def get_cluster_graph(self, cluster):
+        """
+        Returns the sparse graph of the free edges between the vertices of the cluster. The
+        edges are checked with a single batch query the first time the cluster is needed
+        """
+
+        graph = self.cluster_graphs.get(cluster)
+        if graph is not None:
+            return graph
+
+        min_i, min_j, max_i, max_j = self.cluster_range(cluster)
+        width, height = max_i - min_i + 1, max_j - min_j + 1
+
+        a, b = (grid.ravel() for grid in np.meshgrid(np.arange(width), np.arange(height), indexing='ij'))
+        starts, ends, sources, targets, costs = [], [], [], [], []
+        for direction in range(4):
+            da, db = DIRECTIONS[direction]
+            inside = (a + da >= 0) & (a + da < width) & (b + db >= 0) & (b + db < height)
+            starts.append(self.lattice_points(min_i + a[inside], min_j + b[inside]))
+            ends.append(self.lattice_points(min_i + a[inside] + da, min_j + b[inside] + db))
+            sources.append(a[inside] * height + b[inside])
+            targets.append((a[inside] + da) * height + b[inside] + db)
+            costs.append(np.full(np.count_nonzero(inside), math.hypot(da, db) * self.discretization_step))
+
+        free = ~self.check_segments(np.concatenate(starts), np.concatenate(ends))
+        graph = csr_matrix((np.concatenate(costs)[free], (np.concatenate(sources)[free], np.concatenate(targets)[free])),
+                           shape=(width * height, width * height))
+
+        self.cluster_graphs[cluster] = graph
+        return graph
+
+    def get_entrances(self, cluster, axis):
+        """
+        Returns the transitions between the cluster and the next one along the axis (0 for
+        x, 1 for y), as pairs of vertices on the two sides of the border. Each run of free
+        crossing edges gets a transition in the middle, or one at each end if it is long
+        """
+
+        key = cluster + (axis,)
+        entrances = self.entrances.get(key)
+        if entrances is not None:
+            return entrances
+
+        # Clusters on the lower borders of the lattice have no previous cluster
+        entrances = []
+        min_i, min_j, max_i, max_j = self.cluster_range(cluster)
+        if axis == 0 and min_i >= 0 and max_i + 1 < self.lattice_width:
+            i = np.full(max_j - min_j + 1, max_i)
+            j = np.arange(min_j, max_j + 1)
+        elif axis == 1 and min_j >= 0 and max_j + 1 < self.lattice_height:
+            i = np.arange(min_i, max_i + 1)
+            j = np.full(max_i - min_i + 1, max_j)
+        else:
+            self.entrances[key] = entrances
+            return entrances
+
+        di, dj = (1, 0) if axis == 0 else (0, 1)
+        free = ~self.check_segments(self.lattice_points(i, j), self.lattice_points(i + di, j + dj))
+
+        runs = []
+        for k, is_free in enumerate(free.tolist()):
+            if not is_free:
+                continue
+            if runs and runs[-1][1] == k - 1:
+                runs[-1][1] = k
+            else:
+                runs.append([k, k])
+
+        for first, last in runs:
+            ks = (first, last) if last - first + 1 >= 6 else ((first + last) // 2,)
+            for k in ks:
+                vertex = int(i[k]) * self.lattice_height + int(j[k])
+                entrances.append((vertex, vertex + di * self.lattice_height + dj))
+
+        self.entrances[key] = entrances
+        return entrances
+
+    def search_cluster(self, sources, targets):
+        """
+        Shortest paths from each of the sources to the targets without leaving the cluster
+        they all belong to. Returns, for each source, the costs of the targets that can be
+        reached, and the predecessors of the vertices of the cluster on the shortest paths
+        """
+
+        cluster = self.cluster_of(sources[0])
+        costs, predecessors = dijkstra(self.get_cluster_graph(cluster), directed=False,
+                                       indices=[self.local_index(source) for source in sources],
+                                       return_predecessors=True)
+
+        target_indices = [self.local_index(target) for target in targets]
+        reached = [{target: float(source_costs[index])
+                    for target, index in zip(targets, target_indices) if source_costs[index] < math.inf}
+                   for source_costs in costs]
+
+        return reached, predecessors
+
+    def get_abstract_edges(self, cluster):
+        """
+        Returns the edges of the abstract graph leaving the transitions of the cluster
+        """
+
+        edges = self.abstract_edges.get(cluster)
+        if edges is not None:
+            return edges
+
+        ci, cj = cluster
+        crossings = []
+        for entrance in self.get_entrances(cluster, 0) + self.get_entrances(cluster, 1):
+            crossings.append(entrance)
+        for entrance in self.get_entrances((ci - 1, cj), 0) + self.get_entrances((ci, cj - 1), 1):
+            crossings.append((entrance[1], entrance[0]))
+
+        edges = {}
+        for vertex, other in crossings:
+            edges.setdefault(vertex, []).append((other, self.discretization_step))
+
+        transitions = list(edges)
+        if transitions:
+            reached, _ = self.search_cluster(transitions, transitions)
+            for vertex, costs in zip(transitions, reached):
+                edges[vertex].extend((other, cost) for other, cost in costs.items() if other != vertex)
+
+        self.abstract_edges[cluster] = edges
+        return edges
+
+    def sync_cache(self):
+        """
+        Drop the parts of the abstract graph the map changes since the last search might have invalidated
+        """
+
+        lattice = (self.lattice_min_i, self.lattice_min_j, self.lattice_width, self.lattice_height)
+        changes = [] if self.map_version is None else self.world_map.changes_since(self.map_version)
+
+        if self.map_version is None or lattice != self.cached_lattice or any(change.op == 'reset' for change in changes):
+            self.cluster_graphs = {}
+            self.entrances = {}
+            self.abstract_edges = {}
+
+        else:
+            for cluster in list(self.cluster_graphs.keys() | self.abstract_edges.keys()):
+                if not any(change.overlaps(self.cluster_bounds(cluster)) for change in changes):
+                    continue
+
+                ci, cj = cluster
+                self.cluster_graphs.pop(cluster, None)
+                for key in ((ci, cj, 0), (ci, cj, 1), (ci - 1, cj, 0), (ci, cj - 1, 1)):
+                    self.entrances.pop(key, None)
+                for neighbor in ((ci, cj), (ci - 1, cj), (ci + 1, cj), (ci, cj - 1), (ci, cj + 1)):
+                    self.abstract_edges.pop(neighbor, None)
+
+        self.map_version = self.world_map.version
+        self.cached_lattice = lattice
+
+    # ----------------------------------- Search --------------------------------- #
+
+    def pre_search(self):
+
+        self.init_lattice()
+        self.sync_cache()
+
+        self.start_vertex = self.nearest_vertex(self.start)
+        self.goal_vertex = self.nearest_vertex(self.world_map.goal)
+        self.goal_reached = False
+
+        # The start and the goal are connected to the transitions of their clusters
+        start_targets = list(self.get_abstract_edges(self.cluster_of(self.start_vertex)))
+        if self.cluster_of(self.start_vertex) == self.cluster_of(self.goal_vertex):
+            start_targets.append(self.goal_vertex)
+        (self.start_edges,), _ = self.search_cluster([self.start_vertex], start_targets)
+        (self.goal_edges,), _ = self.search_cluster(
+            [self.goal_vertex], list(self.get_abstract_edges(self.cluster_of(self.goal_vertex))))
+
+        self.g_score = {self.start_vertex: 0.0}
+        self.parents = {self.start_vertex: None}
+        self.closed_set = set()
+
+        start_heuristic = self.heuristic(self.vertex_point(self.start_vertex))
+        self.open_set = [(start_heuristic, start_heuristic, self.start_vertex)]
+
+    def heuristic(self, point):
+        return point.distance(self.world_map.goal)
+
+    def can_run(self):
+        return not self.goal_reached and len(self.open_set) > 0
+
+    def step_search(self):
+
+        current_vertex = None
+        while self.open_set:
+            _, _, vertex = heapq.heappop(self.open_set)
+            if vertex not in self.closed_set:
+                current_vertex = vertex
+                break
+
+        if current_vertex is None:
+            return
+
+        self.closed_set.add(current_vertex)
+
+        if current_vertex == self.goal_vertex:
+            self.goal_reached = True
+            return
+
+        edges = list(self.get_abstract_edges(self.cluster_of(current_vertex)).get(current_vertex, []))
+        if current_vertex == self.start_vertex:
+            edges.extend(self.start_edges.items())
+        if current_vertex in self.goal_edges:
+            edges.append((self.goal_vertex, self.goal_edges[current_vertex]))
+
+        current_cost = self.g_score[current_vertex]
+        for vertex, cost in edges:
+
+            if vertex in self.closed_set:
+                continue
+
+            new_cost = current_cost + cost
+            if new_cost < self.g_score.get(vertex, math.inf):
+
+                point = self.vertex_point(vertex)
+
+                # Update the draw list the first time the transition is reached
+                if vertex not in self.parents:
+                    self.draw_list.append(self.get_view(point))
+
+                self.g_score[vertex] = new_cost
+                self.parents[vertex] = current_vertex
+
+                new_heuristic = self.heuristic(point)
+                heapq.heappush(self.open_set, (new_cost + new_heuristic, new_heuristic, vertex))
+
+    def post_search(self):
+        if self.goal_reached:
+            self.reconstruct_path(self.goal_vertex)
+
+    def refine(self, vertex, other):
+        """
+        Returns the lattice vertices from the vertex (excluded) to the other (included)
+        """
+
+        if self.cluster_of(vertex) != self.cluster_of(other):
+            return [other]
+
+        _, predecessors = self.search_cluster([vertex], [other])
+
+        # Walk the predecessors back within the cluster, converting the local indices to vertex ids
+        min_i, min_j, _, max_j = self.cluster_range(self.cluster_of(vertex))
+        height = max_j - min_j + 1
+        source, index = self.local_index(vertex), self.local_index(other)
+        vertices = []
+        while index != source:
+            a, b = divmod(index, height)
+            vertices.append((min_i + a) * self.lattice_height + (min_j + b))
+            index = predecessors[0, index]
+
+        vertices.reverse()
+        return vertices
+
+    def reconstruct_path(self, goal_vertex):
+
+        # Transitions of the abstract path
+        abstract_path = []
+        vertex = goal_vertex
+        while vertex is not None:
+            abstract_path.append(vertex)
+            vertex = self.parents[vertex]
+        abstract_path.reverse()
+
+        # Refine each abstract edge within its cluster
+        vertices = [abstract_path[0]]
+        for vertex, other in zip(abstract_path, abstract_path[1:]):
+            vertices.extend(self.refine(vertex, other))
+
+        path = [self.vertex_point(vertex) for vertex in vertices]
+
+        if path[0] != self.start:
+            path.insert(0, self.start)
+
+        # Change the point from the center of the cell that contains the goal to the goal itself
+        path[-1] = self.world_map.goal
+
+        # The transitions sit in the middle of the entrances, pull the path tight skipping
+        # the points the previous waypoint can see past
+        self.path = [path[0]]
+        for k in range(1, len(path) - 1):
+            if self.check_segment(self.path[-1], path[k + 1]):
+                self.path.append(path[k])
+        self.path.append(path[-1])
@@ -0,0 +1,362 @@
+import heapq
+import math
+
+import numpy as np
+
+from model.geometry.point import Point
+
+from model.controllers.search_based_algorithm import SearchBased
+
+
+# Directions of the moves on the lattice, counterclockwise starting from east. The
+# opposite of direction k is (k + 4) % 8, even directions are straight moves
+DIRECTIONS = [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)]
+
+# States of the edges and of the blocks around the vertices; NEAR edges are close to an
+# obstacle on the occupancy grid and have not been checked exactly yet
+UNKNOWN = 0
+FREE = 1
+BLOCKED = 2
+NEAR = 3
+
+
+class JumpPointSearch(SearchBased):
+    """
+    Jump Point Search: A* on the lattice that only expands jump points. From a vertex,
+    the search moves along straight and diagonal rays and stops only at the goal or at
+    vertices with forced neighbors, i.e. neighbors that can't be reached optimally
+    without passing through the vertex because of an obstacle. All the symmetric
+    paths in between are never generated.
+    Obstacles here block edges, not cells (an edge collides if its buffer intersects an
+    obstacle), so the forced neighbors are found with the general pruning rule: a
+    neighbor of a vertex is pruned if, within the 3x3 block around the vertex, the
+    parent reaches it without the vertex with a path that is shorter (or as long, for
+    straight moves) than the one through the vertex.
+    Edges are resolved lazily, only when a jump ray reaches them. The 3x3 block around
+    each vertex on a ray is first looked up on the occupancy grid of the map: if it is
+    free, so are all the edges in it and nothing can be forced there. The pruning rule
+    near the obstacles only looks at the occupancy grid too: the edges the grid can't
+    clear are taken as blocked for the paths that avoid the vertex and as free for the
+    moves out of it, so a neighbor is forced whenever it might be, and at worst the
+    search stops at a few more jump points. The exact checks are left to the edges the
+    rays actually move along.
+    """
+
+    def __init__(self,
+                 world_map,
+                 start=Point(0, 0),
+                 margin=0.2,
+                 iterations_per_step=1,
+                 max_iterations=5000,
+                 discretization_step=0.2
+                 ):
+
+        self.goal_vertex = None
+        self.goal_reached = False
+
+        super().__init__(
+            world_map,
+            start,
+            margin=margin,
+            iterations_per_step=iterations_per_step,
+            max_iterations=max_iterations,
+            dynamic=False,
+            discretization_step=discretization_step
+        )
+
+    def pre_search(self):
+
+        self.init_lattice()
+
+        # State of the edges of each vertex, one column per direction; edges leaving the map are blocked
+        self.edges = np.full((self.lattice_size, 8), UNKNOWN, dtype=np.int8)
+
+        # State of the 3x3 block around each vertex, FREE if there are no obstacles near it
+        self.blocks = np.full(self.lattice_size, UNKNOWN, dtype=np.int8)
+        self.occupancy_grid = self.world_map.get_occupancy_grid(self.occupancy_resolution, self.margin)
+
+        # (vertex, incoming direction) -> forced directions
+        self.forced = {}
+
+        self.g_score = np.full(self.lattice_size, math.inf)
+        self.parents = np.full(self.lattice_size, -1, dtype=np.int64)
+        self.closed_set = np.zeros(self.lattice_size, dtype=bool)
+
+        # Incoming direction of each jump point, -1 for the start
+        self.directions = np.full(self.lattice_size, -1, dtype=np.int64)
+
+        self.start_vertex = self.nearest_vertex(self.start)
+        self.goal_vertex = self.nearest_vertex(self.world_map.goal)
+        self.goal_reached = False
+
+        self.g_score[self.start_vertex] = 0
+        start_heuristic = self.heuristic(self.vertex_point(self.start_vertex))
+        self.open_set = [(start_heuristic, start_heuristic, self.start_vertex)]
+
+    def heuristic(self, point):
+        # Octile distance, exact on an empty lattice
+        dx = abs(point.x - self.world_map.goal.x)
+        dy = abs(point.y - self.world_map.goal.y)
+        return max(dx, dy) + (math.sqrt(2) - 1) * min(dx, dy)
+
+    def can_run(self):
+        return not self.goal_reached and len(self.open_set) > 0
+
+    # ---------------------------------- Edges ----------------------------------- #
+
+    def block_free(self, vertex):
+        """
+        Returns True if the occupancy grid has no obstacles near the 3x3 block around the
+        vertex, in which case all the edges in the block are free, but the ones leaving the map
+        """
+
+        state = self.blocks[vertex]
+        if state == UNKNOWN:
+            point = self.vertex_point(vertex)
+            step = self.discretization_step
+            free = self.occupancy_grid is not None and self.occupancy_grid.is_region_free(
+                (point.x - step, point.y - step, point.x + step, point.y + step))
+            state = FREE if free else BLOCKED
+            self.blocks[vertex] = state
+
+        return state == FREE
+
+    def resolve_edges(self, edges, exact=True):
+        """
+        Find the state of the (vertex, direction) edges that are still unknown. The edges
+        leaving the map are blocked, the others are looked up on the occupancy grid and the
+        ones it can't clear are NEAR. If exact, the NEAR edges are then checked for collisions
+        with a single batch query
+        """
+
+        starts, ends, unresolved = [], [], []
+        for vertex, direction in edges:
+            state = self.edges[vertex, direction]
+            if state == FREE or state == BLOCKED or (state == NEAR and not exact):
+                continue
+
+            i, j = divmod(vertex, self.lattice_height)
+            di, dj = DIRECTIONS[direction]
+            if not (0 <= i + di < self.lattice_width and 0 <= j + dj < self.lattice_height):
+                self.edges[vertex, direction] = BLOCKED
+                continue
+
+            # The edge is in the blocks of both its vertices
+            other = vertex + di * self.lattice_height + dj
+            if state == UNKNOWN and (self.block_free(vertex) or self.block_free(other)):
+                self.edges[vertex, direction] = FREE
+                self.edges[other, (direction + 4) % 8] = FREE
+                continue
+
+            # Mark the edge so that it is not queued twice when listed from both sides
+            self.edges[vertex, direction] = BLOCKED
+            self.edges[other, (direction + 4) % 8] = BLOCKED
+            starts.append((i, j))
+            ends.append((i + di, j + dj))
+            unresolved.append((vertex, direction, other))
+
+        if not unresolved:
+            return
+
+        # Lattice indices to map coordinates
+        offset = np.array([self.lattice_min_i, self.lattice_min_j])
+        starts = (np.array(starts) + offset) * self.discretization_step
+        ends = (np.array(ends) + offset) * self.discretization_step
+
+        if exact:
+            states = np.where(self.check_segments(starts, ends), BLOCKED, FREE)
+        elif self.occupancy_grid is not None:
+            states = np.where(self.occupancy_grid.are_segments_free(starts, ends), FREE, NEAR)
+        else:
+            states = np.full(len(unresolved), NEAR)
+
+        for (vertex, direction, other), state in zip(unresolved, states.tolist()):
+            self.edges[vertex, direction] = state
+            self.edges[other, (direction + 4) % 8] = state
+
+    def move(self, vertex, direction):
+        """
+        Returns the vertex reached moving from the vertex in the direction, None if the edge is blocked
+        """
+
+        if self.edges[vertex, direction] != FREE:
+            self.resolve_edges([(vertex, direction)])
+        if self.edges[vertex, direction] == BLOCKED:
+            return None
+        di, dj = DIRECTIONS[direction]
+        return vertex + di * self.lattice_height + dj
+
+    # ------------------------------ Neighbor pruning ---------------------------- #
+
+    def forced_directions(self, vertex, direction):
+        """
+        Returns the directions of the forced neighbors of the vertex, reached moving in the direction
+        """
+
+        key = (vertex, direction)
+        forced = self.forced.get(key)
+        if forced is not None:
+            return forced
+
+        # Nothing can be forced if there are no obstacles around and the block is all inside the map
+        i, j = divmod(vertex, self.lattice_height)
+        if self.block_free(vertex) and 0 < i < self.lattice_width - 1 and 0 < j < self.lattice_height - 1:
+            self.forced[key] = ()
+            return ()
+
+        # The edges of the vertex towards the neighbors that could be forced, and the edges
+        # between the other vertices of the block, looked up on the occupancy grid only
+        complement = self.natural_complement(direction)
+        self.resolve_edges([(vertex, k) for k in complement] +
+                           [((i + a) * self.lattice_height + (j + b), k)
+                            for a in (-1, 0, 1) for b in (-1, 0, 1)
+                            if (a, b) != (0, 0) and 0 <= i + a < self.lattice_width and 0 <= j + b < self.lattice_height
+                            for k, (da, db) in enumerate(DIRECTIONS)
+                            if (a + da, b + db) != (0, 0) and -1 <= a + da <= 1 and -1 <= b + db <= 1],
+                           exact=False)
+
+        # Only the neighbors the vertex might reach can be forced
+        candidates = [k for k in complement if self.edges[vertex, k] != BLOCKED]
+        if not candidates:
+            self.forced[key] = ()
+            return ()
+
+        # Shortest paths (in steps) from the parent to the other vertices of the block without the
+        # vertex, through the edges that are certainly free
+        di, dj = DIRECTIONS[direction]
+        parent = (-di, -dj)
+        distances = {parent: 0.0}
+        queue = [(0.0, parent)]
+        while queue:
+            distance, (a, b) = heapq.heappop(queue)
+            if distance > distances[(a, b)]:
+                continue
+            for k, (da, db) in enumerate(DIRECTIONS):
+                na, nb = a + da, b + db
+                if (na, nb) == (0, 0) or not (-1 <= na <= 1 and -1 <= nb <= 1):
+                    continue
+                if self.edges[(i + a) * self.lattice_height + (j + b), k] != FREE:
+                    continue
+                new_distance = distance + (1.0 if k % 2 == 0 else math.sqrt(2))
+                if new_distance < distances.get((na, nb), math.inf):
+                    distances[(na, nb)] = new_distance
+                    heapq.heappush(queue, (new_distance, (na, nb)))
+
+        straight = direction % 2 == 0
+        incoming = 1.0 if straight else math.sqrt(2)
+
+        forced = []
+        for k in candidates:
+            through_vertex = incoming + (1.0 if k % 2 == 0 else math.sqrt(2))
+            alternative = distances.get(DIRECTIONS[k], math.inf)
+
+            # Straight moves prune ties, diagonal moves only strictly shorter alternatives
+            if (straight and alternative > through_vertex + 1e-9) or (not straight and alternative >= through_vertex - 1e-9):
+                forced.append(k)
+
+        forced = tuple(forced)
+        self.forced[key] = forced
+        return forced
+
+    @staticmethod
+    def natural_directions(direction):
+        if direction < 0:
+            return tuple(range(8))
+        if direction % 2 == 0:
+            return direction,
+        return (direction - 1) % 8, direction, (direction + 1) % 8
+
+    @staticmethod
+    def natural_complement(direction):
+        # Directions that are not natural and don't lead back to the parent
+        natural = JumpPointSearch.natural_directions(direction)
+        return tuple(k for k in range(8) if k not in natural and k != (direction + 4) % 8)
+
+    # ---------------------------------- Jumping --------------------------------- #
+
+    def jump(self, vertex, direction):
+        """
+        Move from the vertex in the direction until a jump point is found. Returns None
+        if the ray hits an obstacle or the boundary of the map first
+        """
+
+        while True:
+            vertex = self.move(vertex, direction)
+            if vertex is None:
+                return None
+
+            if vertex == self.goal_vertex or len(self.forced_directions(vertex, direction)) > 0:
+                return vertex
+
+            # A diagonal ray stops where one of its straight components finds a jump point
+            if direction % 2 == 1:
+                for component in ((direction - 1) % 8, (direction + 1) % 8):
+                    if self.jump(vertex, component) is not None:
+                        return vertex
+
+    def step_search(self):
+
+        current_vertex = None
+        while self.open_set:
+            _, _, vertex = heapq.heappop(self.open_set)
+            if not self.closed_set[vertex]:
+                current_vertex = vertex
+                break
+
+        if current_vertex is None:
+            return
+
+        self.closed_set[current_vertex] = True
+
+        if current_vertex == self.goal_vertex:
+            self.goal_reached = True
+            return
+
+        direction = self.directions[current_vertex]
+        successors = self.natural_directions(direction)
+        if direction >= 0:
+            successors = successors + self.forced_directions(current_vertex, direction)
+
+        current_point = self.vertex_point(current_vertex)
+        current_cost = self.g_score[current_vertex]
+        for successor in successors:
+
+            jump_point = self.jump(current_vertex, successor)
+            if jump_point is None or self.closed_set[jump_point]:
+                continue
+
+            point = self.vertex_point(jump_point)
+            new_cost = current_cost + current_point.distance(point)
+            if new_cost < self.g_score[jump_point]:
+
+                # Update the draw list the first time the jump point is reached
+                if self.parents[jump_point] < 0:
+                    self.draw_list.append(self.get_view(point))
+
+                self.g_score[jump_point] = new_cost
+                self.parents[jump_point] = current_vertex
+                self.directions[jump_point] = successor
+
+                new_heuristic = self.heuristic(point)
+                heapq.heappush(self.open_set, (new_cost + new_heuristic, new_heuristic, jump_point))
+
+    def post_search(self):
+        if self.goal_reached:
+            self.reconstruct_path(self.goal_vertex)
+
+    def reconstruct_path(self, goal_vertex):
+        # Consecutive jump points are connected by straight or diagonal collision free rays
+        self.path = []
+        vertex = goal_vertex
+
+        while vertex >= 0:
+            self.path.append(self.vertex_point(vertex))
+            vertex = self.parents[vertex]
+
+        self.path.reverse()
+
+        if self.path[0] != self.start:
+            self.path.insert(0, self.start)
+
+        # Change the point from the center of the cell that contains the goal to the goal itself
+        self.path[-1] = self.world_map.goal
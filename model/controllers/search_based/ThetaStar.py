@@ -0,0 +1,195 @@
+import heapq
+import math
+
+import numpy as np
+
+from model.geometry.point import Point
+
+from model.controllers.search_based_algorithm import SearchBased
+
+
+class ThetaStar(SearchBased):
+    """
+    Lazy Theta*: any-angle A* on the lattice of the map. When a vertex is reached, it
+    takes as parent the parent of the vertex it is reached from, as if the two were in
+    line of sight, so paths are not bound to the 45 degree moves of the lattice and
+    have a waypoint only where they bend around an obstacle. The line of sight is
+    verified lazily, once, when the vertex is expanded; if it is blocked the vertex
+    falls back to the best expanded adjacent vertex, as in A*.
+    Lines of sight are cached for the planning run in a dictionary keyed by the pair of
+    vertex ids, the same pair is often checked more than once and the long segments
+    would only crowd the collision cache of the map.
+    """
+
+    def __init__(self,
+                 world_map,
+                 start=Point(0, 0),
+                 margin=0.2,
+                 iterations_per_step=1,
+                 max_iterations=5000,
+                 discretization_step=0.2
+                 ):
+
+        # Vertex whose cell contains the goal, once expanded
+        self.goal_vertex = None
+
+        # (vertex, vertex) -> True if the segment between them is collision free
+        self.line_of_sight_cache = {}
+
+        super().__init__(
+            world_map,
+            start,
+            margin=margin,
+            iterations_per_step=iterations_per_step,
+            max_iterations=max_iterations,
+            dynamic=False,
+            discretization_step=discretization_step
+        )
+
+    def pre_search(self):
+
+        self.init_lattice()
+
+        self.g_score = np.full(self.lattice_size, math.inf)
+        self.parents = np.full(self.lattice_size, -1, dtype=np.int64)
+        self.closed_set = np.zeros(self.lattice_size, dtype=bool)
+        self.line_of_sight_cache = {}
+
+        # The search starts from the vertex nearest to the start, but the first edges
+        # are traced from the start itself
+        self.start_vertex = self.nearest_vertex(self.start)
+        self.g_score[self.start_vertex] = 0
+        self.goal_vertex = None
+
+        # Heap of (f, h, vertex) entries, ties are broken in favor of the vertex nearest to the goal
+        start_heuristic = self.heuristic(self.start)
+        self.open_set = [(start_heuristic, start_heuristic, self.start_vertex)]
+
+    def heuristic(self, point):
+        return point.distance(self.world_map.goal)
+
+    def point_of(self, vertex):
+        if vertex == self.start_vertex:
+            return self.start
+        return self.vertex_point(vertex)
+
+    def line_of_sight(self, vertex, other):
+        """
+        Returns True if the segment between the two vertices is collision free
+        """
+
+        key = (vertex, other) if vertex < other else (other, vertex)
+        visible = self.line_of_sight_cache.get(key)
+        if visible is None:
+            visible = not self.check_segment(self.point_of(vertex), self.point_of(other))
+            self.line_of_sight_cache[key] = visible
+
+        return visible
+
+    def can_run(self):
+        # Termination condition is that the vertex expanded last contains the goal or there is nothing left to expand
+        return self.goal_vertex is None and len(self.open_set) > 0
+
+    def pop_vertex(self):
+        """
+        Pop the open vertex with the lowest f-score, skipping the outdated entries.
+        Returns None if there are no open vertices left
+        """
+
+        while self.open_set:
+            _, _, vertex = heapq.heappop(self.open_set)
+            if not self.closed_set[vertex]:
+                return vertex
+
+        return None
+
+    def set_vertex(self, vertex):
+        """
+        Verify the line of sight between the vertex and its parent. If it is blocked, take
+        as parent the expanded adjacent vertex the vertex is cheapest to reach from
+        """
+
+        parent = self.parents[vertex]
+        if parent < 0 or self.line_of_sight(parent, vertex):
+            return
+
+        point = self.point_of(vertex)
+        adjacent = [other for other in self.adjacent_vertices(vertex) if self.closed_set[other]]
+        adjacent_points = [self.point_of(other) for other in adjacent]
+        collisions = self.check_collisions([point] * len(adjacent), adjacent_points)
+
+        self.g_score[vertex] = math.inf
+        for other, other_point, collision in zip(adjacent, adjacent_points, collisions):
+            new_cost = self.g_score[other] + other_point.distance(point)
+            if not collision and new_cost < self.g_score[vertex]:
+                self.g_score[vertex] = new_cost
+                self.parents[vertex] = other
+
+    def step_search(self):
+
+        current_vertex = self.pop_vertex()
+        if current_vertex is None:
+            return
+
+        self.set_vertex(current_vertex)
+
+        self.closed_set[current_vertex] = True
+        current_point = self.point_of(current_vertex)
+
+        if self.cell_contains(current_point, self.world_map.goal):
+            self.goal_vertex = current_vertex
+            return
+
+        # Check all the edges towards the vertices that are not closed yet at once
+        candidates = [vertex for vertex in self.adjacent_vertices(current_vertex) if not self.closed_set[vertex]]
+        candidate_points = [self.point_of(vertex) for vertex in candidates]
+        collisions = self.check_collisions([current_point] * len(candidates), candidate_points)
+
+        # The adjacent vertices are reached straight from the parent of the current vertex,
+        # the line of sight is checked when they are expanded
+        parent = self.parents[current_vertex]
+        if parent < 0:
+            parent = current_vertex
+        parent_point = self.point_of(parent)
+        parent_cost = self.g_score[parent]
+
+        for vertex, point, collision in zip(candidates, candidate_points, collisions):
+
+            if collision:
+                continue
+
+            new_cost = parent_cost + parent_point.distance(point)
+            if new_cost < self.g_score[vertex]:
+
+                # Update the draw list the first time the vertex is reached
+                if self.parents[vertex] < 0:
+                    self.draw_list.append(self.get_view(point))
+
+                self.g_score[vertex] = new_cost
+                self.parents[vertex] = parent
+
+                new_heuristic = self.heuristic(point)
+                heapq.heappush(self.open_set, (new_cost + new_heuristic, new_heuristic, vertex))
+
+    def post_search(self):
+        if self.goal_vertex is not None:
+            self.reconstruct_path(self.goal_vertex)
+
+    def reconstruct_path(self, goal_vertex):
+        # Reconstruct the path by backtracking through the parent pointers, each
+        # parent is in line of sight with its child
+        self.path = []
+        vertex = goal_vertex
+
+        while vertex >= 0:
+            self.path.append(self.point_of(vertex))
+            vertex = self.parents[vertex]
+
+        self.path.reverse()
+
+        # Change the point from the center of the cell that contains the goal to the goal
+        # itself, or go through the center if the goal is not visible from the previous waypoint
+        if len(self.path) > 1 and self.check_segment(self.path[-2], self.world_map.goal):
+            self.path.append(self.world_map.goal)
+        else:
+            self.path[-1] = self.world_map.goal
@@ -1,9 +1,10 @@
 from abc import abstractmethod
+import math
 
 from model.controllers.search_algorithm import SearchAlgorithm
 from model.geometry.polygon import Polygon
 
-from model.geometry.point import Point
+from model.geometry.point import Point, FrozenPoint
 
 
 class SearchBased(SearchAlgorithm):
@@ -29,6 +30,16 @@ class SearchBased(SearchAlgorithm):
         # Side of the area that each node covers
         self.discretization_step = discretization_step
 
+        # Resolution of the occupancy grid used to skip the exact collision checks
+        # of the edges that are certainly free
+        self.occupancy_resolution = discretization_step / 4
+
+        # Integer indexing of the lattice vertices inside the map (see init_lattice)
+        self.lattice_min_i = 0
+        self.lattice_min_j = 0
+        self.lattice_width = 0
+        self.lattice_height = 0
+
         # Open and closed set
         self.open_set = None
         self.closed_set = None
@@ -83,13 +94,92 @@ class SearchBased(SearchAlgorithm):
         """
         return 0
 
+    def init_lattice(self):
+        """
+        Index the vertices of the lattice that fall inside the map. Vertex (i, j) is the point
+        (i * discretization_step, j * discretization_step), the same points get_neighbors
+        generates, and its id is an integer in [0, lattice_width * lattice_height), so that
+        per-vertex data can be kept in flat arrays
+        """
+        step = self.discretization_step
+        min_x, min_y, max_x, max_y = self.world_map.map_boundaries
+
+        # Round before ceil/floor to absorb floating point noise on the boundaries
+        self.lattice_min_i = math.ceil(round(min_x / step, 9))
+        self.lattice_min_j = math.ceil(round(min_y / step, 9))
+        self.lattice_width = max(0, math.floor(round(max_x / step, 9)) - self.lattice_min_i + 1)
+        self.lattice_height = max(0, math.floor(round(max_y / step, 9)) - self.lattice_min_j + 1)
+
+    @property
+    def lattice_size(self):
+        return self.lattice_width * self.lattice_height
+
+    def vertex_id(self, i, j):
+        return (i - self.lattice_min_i) * self.lattice_height + (j - self.lattice_min_j)
+
+    def vertex_indices(self, vertex_id):
+        i, j = divmod(vertex_id, self.lattice_height)
+        return i + self.lattice_min_i, j + self.lattice_min_j
+
+    def vertex_point(self, vertex_id):
+        i, j = self.vertex_indices(vertex_id)
+        return FrozenPoint(i * self.discretization_step, j * self.discretization_step)
+
+    def nearest_vertex(self, point):
+        """
+        Returns the id of the lattice vertex nearest to the point
+        """
+        i = round(point.x / self.discretization_step)
+        j = round(point.y / self.discretization_step)
+        i = min(max(i, self.lattice_min_i), self.lattice_min_i + self.lattice_width - 1)
+        j = min(max(j, self.lattice_min_j), self.lattice_min_j + self.lattice_height - 1)
+        return self.vertex_id(i, j)
+
+    def adjacent_vertices(self, vertex_id):
+        """
+        Returns the ids of the (up to 8) vertices adjacent to the vertex inside the map
+        """
+        i, j = divmod(vertex_id, self.lattice_height)
+        adjacent = []
+        for di in (-1, 0, 1):
+            ni = i + di
+            if not 0 <= ni < self.lattice_width:
+                continue
+            for dj in (-1, 0, 1):
+                nj = j + dj
+                if (di != 0 or dj != 0) and 0 <= nj < self.lattice_height:
+                    adjacent.append(ni * self.lattice_height + nj)
+        return adjacent
+
+    def check_segments(self, starts, ends):
+        """
+        Edges the occupancy grid of the map reports as free are accepted with an array
+        lookup, only the others go through the exact check
+        """
+
+        occupancy_grid = self.world_map.get_occupancy_grid(self.occupancy_resolution, self.margin)
+        if occupancy_grid is None:
+            return super().check_segments(starts, ends)
+
+        collisions = ~occupancy_grid.are_segments_free(starts, ends)
+        if collisions.any():
+            collisions[collisions] = super().check_segments(starts[collisions], ends[collisions])
+
+        return collisions
+
+    def check_segment(self, start, end):
+        occupancy_grid = self.world_map.get_occupancy_grid(self.occupancy_resolution, self.margin)
+        if occupancy_grid is not None and occupancy_grid.are_segments_free([(start.x, start.y)], [(end.x, end.y)])[0]:
+            return False
+        return super().check_segment(start, end)
+
     def get_neighbors(self, point, include_current=False):
 
         # The point might not be exactly a vertex of a grid with size discretization_step
         new_x = round(point.x / self.discretization_step) * self.discretization_step
         new_y = round(point.y / self.discretization_step) * self.discretization_step
 
-        neighbors = []
+        candidates = []
 
         for i in range(-1, 2):
             for j in range(-1, 2):
@@ -106,21 +196,30 @@ class SearchBased(SearchAlgorithm):
                         neighbor_x = round(neighbor_x / self.discretization_step) * self.discretization_step
                         neighbor_y = round(neighbor_y / self.discretization_step) * self.discretization_step
 
-                        neighbor = Point(neighbor_x, neighbor_y)
+                        # Immutable point with cached hash, used as key of the generated_neighbors set
+                        neighbor = FrozenPoint(neighbor_x, neighbor_y)
 
                         # Check if the node has previously been generated
                         if neighbor in self.generated_neighbors:
                             continue
 
-                        # Check if there is a collision
-                        if self.check_collision(point, neighbor):
-                            continue
+                        candidates.append(neighbor)
+
+        # Check all the edges towards the candidates at once
+        collisions = self.check_collisions([point] * len(candidates), candidates)
+
+        neighbors = []
+        for neighbor, collision in zip(candidates, collisions):
+
+            # Skip the neighbor if there is a collision
+            if collision:
+                continue
 
-                        # Add to the list of nodes to return
-                        neighbors.append(neighbor)
+            # Add to the list of nodes to return
+            neighbors.append(neighbor)
 
-                        # Add to the generated_node set so that the next iteration will discard it
-                        self.generated_neighbors.add(neighbor)
+            # Add to the generated_node set so that the next iteration will discard it
+            self.generated_neighbors.add(neighbor)
 
         return neighbors
 
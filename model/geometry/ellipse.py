@@ -37,6 +37,27 @@ class Ellipse(Shape):
 
         return {'x': x, 'y': y}
 
+    def generate_points_inside(self, count):
+        """
+        Generate count points uniformly distributed inside the ellipse at once,
+        returns a (count, 2) array
+        """
+
+        theta = np.random.uniform(0, 2 * np.pi, count)
+        r = np.sqrt(np.random.uniform(0, 1, count))
+
+        x_prime = self.a * r * np.cos(theta)
+        y_prime = self.b * r * np.sin(theta)
+
+        cos_phi = np.cos(self.phi)
+        sin_phi = np.sin(self.phi)
+
+        points = np.empty((count, 2))
+        points[:, 0] = self.pose.x + x_prime * cos_phi - y_prime * sin_phi
+        points[:, 1] = self.pose.y + x_prime * sin_phi + y_prime * cos_phi
+
+        return points
+
     def get_bounds(self):
 
         # Calculate the bounds without generating all points
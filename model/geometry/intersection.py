@@ -3,6 +3,8 @@ from model.geometry.circle import Circle
 from model.geometry.rectangle import Rectangle
 from model.geometry.segment import Segment
 
+import numpy as np
+
 
 def polygon_intersects_circle(polygon, circle):
     for edge in polygon.get_edges():
@@ -92,6 +94,58 @@ def circle_intersects_segment(circle, segment):
     return segment_intersects_circle(segment, circle)
 
 
+def segment_buffers_intersect_polygons(starts, ends, margin, polygons_vertices):
+    """
+    Vectorized version of the separating axis test between the buffers of K segments
+    and M convex polygons. The buffer of each segment is the rectangle built by
+    Polygon.segment_buffer with margin/2 on each side; zero length segments are
+    buffered with a segment of length margin orthogonal to the x axis.
+
+    :param starts: (K, 2) array of segment start points.
+    :param ends: (K, 2) array of segment end points.
+    :param margin: total width of the segment buffers.
+    :param polygons_vertices: (M, V, 2) array of polygon vertices. Polygons with less
+        than V vertices can be padded by repeating their last vertex.
+    :return: (K, M) boolean array, True where the k-th buffer intersects the m-th polygon.
+    """
+
+    starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=np.float64).reshape(-1, 2)
+    polygons_vertices = np.asarray(polygons_vertices, dtype=np.float64)
+
+    # Unit direction and normal of each segment
+    direction = ends - starts
+    length = np.hypot(direction[:, 0], direction[:, 1])
+    degenerate = length == 0
+    direction[degenerate] = (1.0, 0.0)
+    length[degenerate] = 1.0
+    direction /= length[:, None]
+    normal = np.stack((-direction[:, 1], direction[:, 0]), axis=1)
+
+    # (K, 4, 2) corners of the buffers
+    offset = normal * (margin / 2)
+    buffers = np.stack((starts + offset, ends + offset, ends - offset, starts - offset), axis=1)
+
+    # Axes of the buffers (K, 2, 2) and of the polygons (M, V, 2)
+    buffer_axes = np.stack((direction, normal), axis=1)
+    polygon_edges = np.roll(polygons_vertices, -1, axis=1) - polygons_vertices
+    polygon_axes = np.stack((-polygon_edges[..., 1], polygon_edges[..., 0]), axis=-1)
+
+    # Projections onto the axes of the buffers
+    buffer_on_buffer_axes = np.einsum('kad,kcd->kac', buffer_axes, buffers)
+    polygon_on_buffer_axes = np.einsum('kad,mvd->kmav', buffer_axes, polygons_vertices)
+    separated = ((buffer_on_buffer_axes.max(axis=-1)[:, None] < polygon_on_buffer_axes.min(axis=-1)) |
+                 (polygon_on_buffer_axes.max(axis=-1) < buffer_on_buffer_axes.min(axis=-1)[:, None])).any(axis=-1)
+
+    # Projections onto the axes of the polygons
+    polygon_on_polygon_axes = np.einsum('mad,mvd->mav', polygon_axes, polygons_vertices)
+    buffer_on_polygon_axes = np.einsum('mad,kcd->kmac', polygon_axes, buffers)
+    separated |= ((buffer_on_polygon_axes.max(axis=-1) < polygon_on_polygon_axes.min(axis=-1)[None]) |
+                  (polygon_on_polygon_axes.max(axis=-1)[None] < buffer_on_polygon_axes.min(axis=-1))).any(axis=-1)
+
+    return ~separated
+
+
 def check_intersection(obj_1, obj_2):
     if isinstance(obj_1, Circle):
         if isinstance(obj_2, Circle):
@@ -4,6 +4,8 @@ import numpy as np
 
 class Point:
 
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -169,3 +171,61 @@ class Point:
 
     def copy(self):
         return Point(self.x, self.y)
+
+
+class FrozenPoint(Point):
+    """
+    Immutable and hashable point. The hash is computed once at construction
+    time, which makes instances of this class cheap to use as keys of dictionaries
+    and sets (e.g. grid cells). Equality and hashing are consistent with the
+    Point class, so a FrozenPoint and a Point with the same coordinates match
+    the same key. In-place operators return new objects instead of mutating.
+    """
+
+    __slots__ = ('_hash',)
+
+    def __init__(self, x, y):
+        object.__setattr__(self, 'x', x)
+        object.__setattr__(self, 'y', y)
+        object.__setattr__(self, '_hash', hash((x, y)))
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f'FrozenPoint is immutable, cannot set {key}')
+
+    def __delattr__(self, key):
+        raise AttributeError(f'FrozenPoint is immutable, cannot delete {key}')
+
+    def __setitem__(self, key, value):
+        raise TypeError('FrozenPoint is immutable')
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return FrozenPoint, (self.x, self.y)
+
+    def __str__(self):
+        return f"FrozenPoint(x={self.x}, y={self.y})"
+
+    def __itruediv__(self, other):
+        return self / other
+
+    def __ifloordiv__(self, other):
+        return self // other
+
+    def __isub__(self, other):
+        return self - other
+
+    def __iadd__(self, other):
+        return self + other
+
+    def __imul__(self, other):
+        return self * other
+
+    def copy(self):
+        # Immutable, no need to copy it
+        return self
+
+    @classmethod
+    def from_dict(cls, dictionary):
+        return FrozenPoint(dictionary['x'], dictionary['y'])
@@ -5,6 +5,8 @@ import numpy as np
 
 class Pose:
 
+    __slots__ = ('x', 'y', 'theta')
+
     def __init__(self, x, y, theta):
         self.x = x
         self.y = y
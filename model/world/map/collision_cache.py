@@ -0,0 +1,156 @@
+from collections import OrderedDict, defaultdict
+import math
+
+
+class CollisionCache:
+    """
+    Bounded LRU cache of edge collision results. Each entry maps an edge (start,
+    end, margin) to the result of the collision check and to the bounding box of
+    the buffered edge. The edge is undirected: (a, b) and (b, a) share the same key.
+    When an obstacle is added or removed, only the entries whose bounding box
+    overlaps the obstacle are dropped. Adding an obstacle can only turn a free
+    edge into a colliding one and removing an obstacle can only do the opposite,
+    so the invalidation can be further restricted to the entries that hold the
+    result that might have changed.
+    The keys are also bucketed by the cells of a coarse grid their bounding box
+    overlaps, so an invalidation only visits the buckets of the region instead of
+    the whole cache. The few edges that span many cells are kept aside and always
+    visited, so that they don't fill a bucket in each of their cells.
+    """
+
+    def __init__(self, capacity=50000, cell_size=0.5, max_cells=16):
+
+        if cell_size <= 0:
+            raise ValueError(f'Invalid cell size: {cell_size}')
+
+        self.capacity = capacity
+        self.cell_size = cell_size
+        self.max_cells = max_cells
+
+        # key -> (collision, bounds, cell range or None for the wide edges)
+        self._entries = OrderedDict()
+
+        # (i, j) -> keys whose bounds overlap the cell, and keys of the wide edges
+        self._buckets = defaultdict(set)
+        self._wide = set()
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(start, end, margin):
+        a = (start.x, start.y)
+        b = (end.x, end.y)
+        if b < a:
+            a, b = b, a
+        return a + b + (margin,)
+
+    def get(self, key):
+        """
+        Returns the cached result for the key or None if the edge is not cached
+        """
+
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, collision):
+        x1, y1, x2, y2, margin = key
+        half_margin = margin / 2
+        bounds = (min(x1, x2) - half_margin,
+                  min(y1, y2) - half_margin,
+                  max(x1, x2) + half_margin,
+                  max(y1, y2) + half_margin)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries[key] = (collision, entry[1], entry[2])
+            self._entries.move_to_end(key)
+            return
+
+        cell_range = self._cell_range(bounds)
+        min_i, min_j, max_i, max_j = cell_range
+        if (max_i - min_i + 1) * (max_j - min_j + 1) > self.max_cells:
+            cell_range = None
+            self._wide.add(key)
+        else:
+            for i in range(min_i, max_i + 1):
+                for j in range(min_j, max_j + 1):
+                    self._buckets[(i, j)].add(key)
+
+        self._entries[key] = (collision, bounds, cell_range)
+
+        # Evict the least recently used entry
+        if len(self._entries) > self.capacity:
+            self._remove(next(iter(self._entries)))
+
+    def _cell_range(self, bounds):
+        min_x, min_y, max_x, max_y = bounds
+        return (math.floor(min_x / self.cell_size), math.floor(min_y / self.cell_size),
+                math.floor(max_x / self.cell_size), math.floor(max_y / self.cell_size))
+
+    def _remove(self, key):
+        _, _, cell_range = self._entries.pop(key)
+
+        if cell_range is None:
+            self._wide.discard(key)
+            return
+
+        min_i, min_j, max_i, max_j = cell_range
+        for i in range(min_i, max_i + 1):
+            for j in range(min_j, max_j + 1):
+                bucket = self._buckets[(i, j)]
+                bucket.discard(key)
+                if len(bucket) == 0:
+                    del self._buckets[(i, j)]
+
+    def invalidate(self, bounds, collision=None):
+        """
+        Drop the entries whose bounding box overlaps the (min_x, min_y, max_x, max_y)
+        region. If collision is not None, only the entries holding that result are
+        dropped. Returns the number of dropped entries.
+        """
+
+        # Candidates are the keys in the buckets of the region and the wide edges
+        candidates = set(self._wide)
+        min_i, min_j, max_i, max_j = self._cell_range(bounds)
+        if (max_i - min_i + 1) * (max_j - min_j + 1) > len(self._buckets):
+            for (i, j), bucket in self._buckets.items():
+                if min_i <= i <= max_i and min_j <= j <= max_j:
+                    candidates.update(bucket)
+        else:
+            for i in range(min_i, max_i + 1):
+                for j in range(min_j, max_j + 1):
+                    bucket = self._buckets.get((i, j))
+                    if bucket is not None:
+                        candidates.update(bucket)
+
+        min_x, min_y, max_x, max_y = bounds
+        stale = []
+        for key in candidates:
+            cached, (e_min_x, e_min_y, e_max_x, e_max_y), _ = self._entries[key]
+            if ((collision is None or cached == collision) and
+                    not (e_max_x < min_x or e_min_x > max_x or e_max_y < min_y or e_min_y > max_y)):
+                stale.append(key)
+
+        for key in stale:
+            self._remove(key)
+
+        return len(stale)
+
+    def clear(self):
+        self._entries.clear()
+        self._buckets.clear()
+        self._wide.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
@@ -0,0 +1,164 @@
+import math
+
+import numpy as np
+from scipy.ndimage import distance_transform_edt
+
+
+class DistanceField:
+    """
+    Signed distance field of the map, sampled at the centers of a grid with the given
+    resolution: positive values are distances to the nearest obstacle, negative values
+    (inside the obstacles) are distances to the nearest free space. Distances are
+    computed with the euclidean distance transform of the rasterized obstacles, so they
+    are accurate up to the resolution, and are clamped to max_distance. Since nothing
+    farther than max_distance matters, a change to the obstacles is repaired by
+    recomputing the transform only around the region that changed.
+    """
+
+    def __init__(self, bounds, resolution, max_distance):
+
+        if resolution <= 0:
+            raise ValueError(f'Invalid resolution: {resolution}')
+
+        if max_distance <= 0:
+            raise ValueError(f'Invalid max distance: {max_distance}')
+
+        self.bounds = tuple(bounds)
+        self.resolution = resolution
+        self.max_distance = max_distance
+
+        min_x, min_y, max_x, max_y = self.bounds
+        self.width = max(1, math.ceil((max_x - min_x) / resolution))
+        self.height = max(1, math.ceil((max_y - min_y) / resolution))
+
+        # Rasterized obstacles and distance values, indexed as [i, j] with i along x and j along y
+        self.occupied = np.zeros((self.width, self.height), dtype=bool)
+        self.field = np.full((self.width, self.height), float(max_distance))
+
+        # Number of cells the clamped distances can span
+        self._reach = math.ceil(max_distance / resolution) + 1
+
+    def _window(self, bounds, padding=0):
+        """
+        Returns the index range (min_i, min_j, max_i, max_j), inclusive, of the cells whose
+        center falls in the bounds, grown by padding cells on each side
+        """
+
+        min_x, min_y, max_x, max_y = bounds
+        b_min_x, b_min_y = self.bounds[0], self.bounds[1]
+        return (max(0, math.ceil((min_x - b_min_x) / self.resolution - 0.5) - padding),
+                max(0, math.ceil((min_y - b_min_y) / self.resolution - 0.5) - padding),
+                min(self.width - 1, math.floor((max_x - b_min_x) / self.resolution - 0.5) + padding),
+                min(self.height - 1, math.floor((max_y - b_min_y) / self.resolution - 0.5) + padding))
+
+    def _rasterize(self, polygon, window):
+        """
+        Mark the cells of the window whose center is inside the (convex) polygon
+        """
+
+        vertices = np.asarray(polygon.to_point_array(), dtype=np.float64)
+        min_i, min_j, max_i, max_j = self._window(tuple(vertices.min(axis=0)) + tuple(vertices.max(axis=0)))
+        min_i, min_j = max(min_i, window[0]), max(min_j, window[1])
+        max_i, max_j = min(max_i, window[2]), min(max_j, window[3])
+        if min_i > max_i or min_j > max_j:
+            return
+
+        centers_x = self.bounds[0] + (np.arange(min_i, max_i + 1) + 0.5) * self.resolution
+        centers_y = self.bounds[1] + (np.arange(min_j, max_j + 1) + 0.5) * self.resolution
+        x, y = np.meshgrid(centers_x, centers_y, indexing='ij')
+
+        # Inside a convex polygon the point is on the same side of all the edges
+        edges = np.roll(vertices, -1, axis=0) - vertices
+        crosses = (edges[:, 0] * (y[..., None] - vertices[:, 1]) -
+                   edges[:, 1] * (x[..., None] - vertices[:, 0]))
+        inside = (crosses >= 0).all(axis=-1) | (crosses <= 0).all(axis=-1)
+
+        self.occupied[min_i:max_i + 1, min_j:max_j + 1] |= inside
+
+    def _compute(self, window):
+        """
+        Recompute the distances of the cells in the window. The transform is run on the
+        window grown by the reach of the distances, so that the values in the window are exact
+        """
+
+        min_i, min_j, max_i, max_j = window
+        min_pi, min_pj = max(0, min_i - self._reach), max(0, min_j - self._reach)
+        max_pi, max_pj = min(self.width - 1, max_i + self._reach), min(self.height - 1, max_j + self._reach)
+
+        occupied = self.occupied[min_pi:max_pi + 1, min_pj:max_pj + 1]
+
+        # Distances are measured between cell centers, shift them by half a cell so
+        # that the field crosses zero on the boundary of the obstacles
+        half_cell = self.resolution / 2
+        if occupied.any():
+            outside = distance_transform_edt(~occupied) * self.resolution - half_cell
+        else:
+            outside = np.full(occupied.shape, float(self.max_distance))
+
+        if not occupied.all():
+            inside = distance_transform_edt(occupied) * self.resolution - half_cell
+        else:
+            inside = np.full(occupied.shape, float(self.max_distance))
+
+        field = np.clip(np.where(occupied, -inside, outside), -self.max_distance, self.max_distance)
+
+        self.field[min_i:max_i + 1, min_j:max_j + 1] = field[min_i - min_pi:max_i - min_pi + 1,
+                                                             min_j - min_pj:max_j - min_pj + 1]
+
+    def build(self, polygons):
+        """
+        Compute the whole field from the given polygons
+        """
+
+        window = (0, 0, self.width - 1, self.height - 1)
+        self.occupied[:] = False
+        for polygon in polygons:
+            self._rasterize(polygon, window)
+        self._compute(window)
+
+    def update_region(self, bounds, polygons):
+        """
+        Repair the field after a change in the bounds (e.g. an obstacle has been added or
+        removed). The polygons are the ones that can occupy the cells within max_distance
+        from the bounds
+        """
+
+        # Cells whose occupancy changed
+        changed = self._window(bounds, padding=1)
+        if changed[0] > changed[2] or changed[1] > changed[3]:
+            return
+
+        min_i, min_j, max_i, max_j = changed
+        self.occupied[min_i:max_i + 1, min_j:max_j + 1] = False
+        for polygon in polygons:
+            self._rasterize(polygon, changed)
+
+        # Cells whose distance might have changed
+        self._compute(self._window(bounds, padding=self._reach + 1))
+
+    def distances(self, points):
+        """
+        Given a (K, 2) array of points, returns the bilinear interpolation of the field at
+        each of them. Points outside the map take the value of the nearest border
+        """
+
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+        # Continuous coordinates in the grid of the cell centers
+        u = np.clip((points[:, 0] - self.bounds[0]) / self.resolution - 0.5, 0, self.width - 1)
+        v = np.clip((points[:, 1] - self.bounds[1]) / self.resolution - 0.5, 0, self.height - 1)
+
+        i0 = np.minimum(np.floor(u).astype(np.int64), max(0, self.width - 2))
+        j0 = np.minimum(np.floor(v).astype(np.int64), max(0, self.height - 2))
+        i1 = np.minimum(i0 + 1, self.width - 1)
+        j1 = np.minimum(j0 + 1, self.height - 1)
+        du, dv = u - i0, v - j0
+
+        return ((1 - du) * (1 - dv) * self.field[i0, j0] + du * (1 - dv) * self.field[i1, j0] +
+                (1 - du) * dv * self.field[i0, j1] + du * dv * self.field[i1, j1])
+
+    def distance(self, x, y):
+        """
+        Signed distance of the point (x, y) from the nearest obstacle
+        """
+        return float(self.distances([(x, y)])[0])
@@ -0,0 +1,223 @@
+from collections import defaultdict
+import math
+
+from model.geometry.intersection import check_intersection
+
+from model.world.map.map import Map
+
+
+class GridHashMap(Map):
+
+    def __init__(self, cell_size=None, **kwargs):
+        """
+        This implementation of the Map interface hashes the obstacles in a uniform grid.
+        Each obstacle is stored in all the cells its bounding box overlaps, so a query
+        only has to look at the buckets of the cells covered by the query region.
+        The obstacles are nearly uniform in size: by default the cell is as large as the
+        diagonal of the biggest obstacle, so that any obstacle, however rotated, spans
+        at most 2x2 cells.
+        """
+
+        super().__init__(**kwargs)
+
+        if cell_size is None:
+            cell_size = math.hypot(self.obs_max_width, self.obs_max_height)
+
+        if cell_size <= 0:
+            raise ValueError(f'Invalid cell size: {cell_size}')
+
+        self.cell_size = cell_size
+
+        # (i, j) -> set of IDs of the obstacles overlapping the cell
+        self._cells = defaultdict(set)
+
+        # obstacle_id -> (bounds, (min_i, min_j, max_i, max_j)) the obstacle is hashed with
+        self._hashed = {}
+
+    def _cell_range(self, bounds):
+        min_x, min_y, max_x, max_y = bounds
+        return (math.floor(min_x / self.cell_size), math.floor(min_y / self.cell_size),
+                math.floor(max_x / self.cell_size), math.floor(max_y / self.cell_size))
+
+    def _hash_obstacle(self, obstacle_id, obstacle):
+        bounds = tuple(obstacle.get_bounds())
+        cell_range = self._cell_range(bounds)
+        min_i, min_j, max_i, max_j = cell_range
+        for i in range(min_i, max_i + 1):
+            for j in range(min_j, max_j + 1):
+                self._cells[(i, j)].add(obstacle_id)
+        self._hashed[obstacle_id] = (bounds, cell_range)
+
+    def _unhash_obstacle(self, obstacle_id):
+        entry = self._hashed.pop(obstacle_id, None)
+        if entry is None:
+            return
+
+        min_i, min_j, max_i, max_j = entry[1]
+        for i in range(min_i, max_i + 1):
+            for j in range(min_j, max_j + 1):
+                cell = self._cells[(i, j)]
+                cell.discard(obstacle_id)
+                if not cell:
+                    del self._cells[(i, j)]
+
+    def _rehash(self):
+        self._cells = defaultdict(set)
+        self._hashed = {}
+        for obstacle_id, obstacle in self._obstacles.items():
+            self._hash_obstacle(obstacle_id, obstacle)
+
+    def _add_obstacle(self, obstacle):
+        """
+        Additional logic to handle the grid
+        """
+        self._hash_obstacle(self._next_obstacle_id, obstacle)
+
+    def _remove_obstacle(self, obstacle_id):
+        """
+        Additional logic to handle the grid
+        """
+        self._unhash_obstacle(obstacle_id)
+
+    def query_polygon(self, polygon):
+        result = []
+        for obj_id in self.query_bounds(polygon.get_bounds()):
+
+            # Check if the actual geometry intersects with the query region
+            if check_intersection(polygon, self._obstacles[obj_id].polygon):
+                result.append(obj_id)
+
+        return result
+
+    def query_bounds(self, bounds):
+        """
+        Redefine query_bounds to make it more efficient
+        """
+
+        min_x, min_y, max_x, max_y = bounds
+        min_i, min_j, max_i, max_j = self._cell_range(bounds)
+
+        # Visit the cells covered by the region or, if they are more, only the occupied ones
+        if (max_i - min_i + 1) * (max_j - min_j + 1) <= len(self._cells):
+            buckets = [self._cells[(i, j)]
+                       for i in range(min_i, max_i + 1)
+                       for j in range(min_j, max_j + 1)
+                       if (i, j) in self._cells]
+        else:
+            buckets = [bucket for (i, j), bucket in self._cells.items()
+                       if min_i <= i <= max_i and min_j <= j <= max_j]
+
+        result = set()
+        for bucket in buckets:
+            for obj_id in bucket:
+                if obj_id in result:
+                    continue
+
+                o_min_x, o_min_y, o_max_x, o_max_y = self._hashed[obj_id][0]
+                if not (o_max_x < min_x or o_min_x > max_x or o_max_y < min_y or o_min_y > max_y):
+                    result.add(obj_id)
+
+        return list(result)
+
+    @staticmethod
+    def _merge_bounds(bounds_list):
+        """
+        Merge the overlapping bounds until the remaining ones are disjoint
+        """
+
+        merged = []
+        for bounds in bounds_list:
+            min_x, min_y, max_x, max_y = bounds
+
+            # Absorb the regions it overlaps, the grown region can overlap more of them
+            i = 0
+            while i < len(merged):
+                o_min_x, o_min_y, o_max_x, o_max_y = merged[i]
+                if o_max_x < min_x or o_min_x > max_x or o_max_y < min_y or o_min_y > max_y:
+                    i += 1
+                else:
+                    min_x, min_y = min(min_x, o_min_x), min(min_y, o_min_y)
+                    max_x, max_y = max(max_x, o_max_x), max(max_y, o_max_y)
+                    merged.pop(i)
+                    i = 0
+
+            merged.append((min_x, min_y, max_x, max_y))
+
+        return merged
+
+    def step_motion(self, dt):
+        """
+        Move the obstacles that have a velocity. Only the obstacles whose cell range
+        changed are moved between buckets. The regions swept by the obstacles in the
+        tick are merged, the caches and the grids are repaired once per region and a
+        single change covering all of them is recorded, so that the change log isn't
+        flooded when many obstacles move
+        """
+
+        if not self.enable_changes:
+            return
+
+        moved = []
+        swept_regions = []
+        for obstacle_id, obstacle in self._obstacles.items():
+
+            vx, vy, vz = obstacle.vel
+            if vx == 0 and vy == 0 and vz == 0:
+                continue
+
+            # Bounce on the map boundaries
+            x, y, z = obstacle.polygon.pose
+            lsm = obstacle.linear_speed_multiplier
+
+            new_x = x + vx * lsm * dt
+            new_y = y + vy * lsm * dt
+
+            minx, miny, maxx, maxy = self.map_boundaries
+            if not minx <= new_x <= maxx:
+                obstacle.vel = (-vx, vy, vz)
+
+            if not miny <= new_y <= maxy:
+                obstacle.vel = (obstacle.vel[0], -vy, vz)
+
+            obstacle.step_motion(dt)
+
+            old_bounds, old_cell_range = self._hashed[obstacle_id]
+            new_bounds = tuple(obstacle.get_bounds())
+            self._hashed[obstacle_id] = (new_bounds, old_cell_range)
+            if self._cell_range(new_bounds) != old_cell_range:
+                self._unhash_obstacle(obstacle_id)
+                self._hash_obstacle(obstacle_id, obstacle)
+
+            # The obstacle swept the union of the old and the new bounds
+            moved.append(obstacle_id)
+            swept_regions.append((min(old_bounds[0], new_bounds[0]), min(old_bounds[1], new_bounds[1]),
+                                  max(old_bounds[2], new_bounds[2]), max(old_bounds[3], new_bounds[3])))
+
+        if not moved:
+            return
+
+        for region in self._merge_bounds(swept_regions):
+            self.collision_cache.invalidate(region)
+            self._update_occupancy_grids(region)
+            self._update_distance_fields(region)
+
+        # One change for the whole tick, the obstacle is known only if it is the only one that moved
+        swept_bounds = (min(region[0] for region in swept_regions), min(region[1] for region in swept_regions),
+                        max(region[2] for region in swept_regions), max(region[3] for region in swept_regions))
+        self._record_change('move', moved[0] if len(moved) == 1 else None, swept_bounds)
+
+    def _reset(self):
+        self._rehash()
+
+    def _clear(self):
+        self._rehash()
+
+    def generate(self, forbidden_zones):
+        super().generate(forbidden_zones)
+        self._rehash()
+
+    def _load_from_pickle(self):
+        self._rehash()
+
+    def _load_from_json_data(self):
+        self._rehash()
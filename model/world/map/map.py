@@ -1,4 +1,5 @@
 from abc import abstractmethod
+from collections import deque, namedtuple
 
 import numpy as np
 
@@ -11,9 +12,38 @@ from model.geometry.point import Point
 from model.geometry.circle import Circle
 from model.geometry.polygon import Polygon
 from model.geometry.rectangle import Rectangle
-from model.geometry.intersection import check_intersection
+from model.geometry.intersection import check_intersection, segment_buffers_intersect_polygons
 
 from model.world.map.obstacle import Obstacle
+from model.world.map.collision_cache import CollisionCache
+from model.world.map.occupancy_grid import OccupancyGrid
+from model.world.map.distance_field import DistanceField
+
+
+class MapChange(namedtuple('MapChange', ['version', 'op', 'obstacle_id', 'bounds'])):
+    """
+    Entry of the map change log. The op is one of 'add', 'remove' (a single obstacle
+    changed, obstacle_id and bounds refer to it), 'move' (one or more obstacles moved,
+    bounds cover their old and new positions, obstacle_id is None if more than one
+    moved) or 'reset' (the whole obstacle set has been replaced, obstacle_id and
+    bounds are None). A change with no bounds covers the whole map, even when the map
+    has no boundaries.
+    """
+
+    __slots__ = ()
+
+    def overlaps(self, bounds, margin=0.0):
+        """
+        Returns True if the region of the change, inflated by margin, overlaps the bounds
+        """
+
+        if self.bounds is None:
+            return True
+
+        min_x, min_y, max_x, max_y = self.bounds
+        b_min_x, b_min_y, b_max_x, b_max_y = bounds
+        return not (max_x + margin < b_min_x or min_x - margin > b_max_x or
+                    max_y + margin < b_min_y or min_y - margin > b_max_y)
 
 
 class Map:
@@ -48,6 +78,9 @@ class Map:
                  map_boundaries,
 
                  grid,
+
+                 # Number of changes kept in the change log
+                 change_log_size=256,
                  ):
 
         # Size of the obstacles (for now, only rectangular obstacles are generated)
@@ -100,6 +133,24 @@ class Map:
         # using their velocity vector or can be randomly spawned
         self.enable_changes = True
 
+        # Cache of edge collision results, shared by all the search algorithms
+        # working on this map. It is invalidated by region when obstacles change
+        self.collision_cache = CollisionCache()
+
+        # Occupancy grids used by the grid-based search algorithms, keyed by
+        # (resolution, margin). They are built on demand and updated on each change
+        self._occupancy_grids = {}
+
+        # Signed distance fields, keyed by (resolution, max_distance). They are
+        # computed on demand and repaired locally on each change
+        self._distance_fields = {}
+
+        # Monotonic version of the obstacle set, incremented by each change, and
+        # bounded log of the last changes. Dynamic algorithms can store the version
+        # they synced with and ask for the changes that happened after it
+        self.version = 0
+        self._change_log = deque(maxlen=change_log_size)
+
     @property
     def goal(self):
         return self._current_goal
@@ -108,6 +159,27 @@ class Map:
     def obstacles(self):
         return list(self._obstacles.values())
 
+    def _record_change(self, op, obstacle_id=None, bounds=None):
+        self.version += 1
+        if bounds is not None:
+            bounds = tuple(float(b) for b in bounds)
+        self._change_log.append(MapChange(self.version, op, obstacle_id, bounds))
+
+    def changes_since(self, version):
+        """
+        Returns the list of changes that happened after the specified version, oldest
+        first. If the log no longer covers that version, a single 'reset' change over
+        the whole map is returned instead.
+        """
+
+        if version >= self.version:
+            return []
+
+        if len(self._change_log) == 0 or self._change_log[0].version > version + 1:
+            return [MapChange(self.version, 'reset', None, None)]
+
+        return [change for change in self._change_log if change.version > version]
+
     def set_goal(self, goal, clearance=0.2):
         """
         Set a new goal only if there are no obstacles near it
@@ -143,6 +215,15 @@ class Map:
                     # Call to the private method
                     self._add_obstacle(obstacle)
 
+                    for occupancy_grid in self._occupancy_grids.values():
+                        occupancy_grid.add_polygon(obstacle.polygon)
+                    self._update_distance_fields(obstacle.get_bounds())
+
+                    # Edges that were free near the new obstacle might collide now
+                    self.collision_cache.invalidate(obstacle.get_bounds(), collision=False)
+
+                    self._record_change('add', obstacle_id, obstacle.get_bounds())
+
                     # Increment the index for the next polygon
                     self._next_obstacle_id += 1
 
@@ -164,10 +245,18 @@ class Map:
         if self.enable_changes:
 
             if obstacle_id in self._obstacles:
+                obstacle_bounds = self._obstacles[obstacle_id].get_bounds()
                 del self._obstacles[obstacle_id]
 
+                # Edges that collided near the removed obstacle might be free now
+                self.collision_cache.invalidate(obstacle_bounds, collision=True)
+
+                self._record_change('remove', obstacle_id, obstacle_bounds)
+
                 # Update other data structures
                 self._remove_obstacle(obstacle_id)
+                self._update_occupancy_grids(obstacle_bounds)
+                self._update_distance_fields(obstacle_bounds)
 
                 return True
 
@@ -177,6 +266,71 @@ class Map:
     def _remove_obstacle(self, obstacle_id):
         pass
 
+    def get_occupancy_grid(self, resolution, margin):
+        """
+        Returns the occupancy grid of the map with the specified resolution, inflated by
+        the margin. The grid is built the first time it is requested and then kept in
+        sync with the obstacles. Returns None if the map has no boundaries
+        """
+
+        if self.map_boundaries is None:
+            return None
+
+        key = (resolution, margin)
+        occupancy_grid = self._occupancy_grids.get(key)
+        if occupancy_grid is None:
+            occupancy_grid = OccupancyGrid(self.map_boundaries, resolution, margin)
+            for obstacle in self._obstacles.values():
+                occupancy_grid.add_polygon(obstacle.polygon)
+            self._occupancy_grids[key] = occupancy_grid
+
+        return occupancy_grid
+
+    def _update_occupancy_grids(self, bounds):
+        """
+        Recompute the cells of the occupancy grids near the bounds, where obstacles have changed
+        """
+
+        min_x, min_y, max_x, max_y = bounds
+        for occupancy_grid in self._occupancy_grids.values():
+
+            # Obstacles occupying the affected cells are at most two inflations away from the bounds
+            reach = 2 * occupancy_grid.inflation
+            obstacle_ids = self.query_bounds((min_x - reach, min_y - reach, max_x + reach, max_y + reach))
+            occupancy_grid.update_region(bounds, [self._obstacles[obstacle_id].polygon for obstacle_id in obstacle_ids])
+
+    def get_distance_field(self, resolution=0.05, max_distance=1.0):
+        """
+        Returns the signed distance field of the map with the specified resolution and
+        distances clamped to max_distance. The field is computed the first time it is
+        requested and then repaired on each change. Returns None if the map has no boundaries
+        """
+
+        if self.map_boundaries is None:
+            return None
+
+        key = (resolution, max_distance)
+        distance_field = self._distance_fields.get(key)
+        if distance_field is None:
+            distance_field = DistanceField(self.map_boundaries, resolution, max_distance)
+            distance_field.build([obstacle.polygon for obstacle in self._obstacles.values()])
+            self._distance_fields[key] = distance_field
+
+        return distance_field
+
+    def _update_distance_fields(self, bounds):
+        """
+        Repair the distance fields around the bounds, where obstacles have changed
+        """
+
+        min_x, min_y, max_x, max_y = bounds
+        for distance_field in self._distance_fields.values():
+
+            # Only the occupancy of the cells within a couple of cells from the bounds changes
+            reach = 2 * distance_field.resolution
+            obstacle_ids = self.query_bounds((min_x - reach, min_y - reach, max_x + reach, max_y + reach))
+            distance_field.update_region(bounds, [self._obstacles[obstacle_id].polygon for obstacle_id in obstacle_ids])
+
     def add_obstacles(self, obstacles):
         for obstacle in obstacles:
             self.add_obstacle(obstacle)
@@ -216,6 +370,38 @@ class Map:
 
         pass
 
+    def check_segments(self, starts, ends, margin):
+        """
+        Batch collision check for K segments. Each segment is buffered with margin/2
+        on each side (as SearchAlgorithm.check_collision does) and tested against
+        all the obstacles intersecting the bounding box of the whole batch in one
+        vectorized pass. Returns a boolean array of length K that is True where the
+        segment collides with at least an obstacle.
+        """
+
+        starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+        ends = np.asarray(ends, dtype=np.float64).reshape(-1, 2)
+
+        if len(starts) == 0:
+            return np.zeros(0, dtype=bool)
+
+        # Candidate obstacles are the ones in the region covered by the batch
+        endpoints = np.concatenate((starts, ends))
+        min_x, min_y = endpoints.min(axis=0) - margin / 2
+        max_x, max_y = endpoints.max(axis=0) + margin / 2
+        candidate_ids = self.query_bounds((min_x, min_y, max_x, max_y))
+
+        if len(candidate_ids) == 0:
+            return np.zeros(len(starts), dtype=bool)
+
+        # Pad the polygons to the same number of vertices by repeating the last one
+        candidates = [self._obstacles[obstacle_id].polygon.to_point_array() for obstacle_id in set(candidate_ids)]
+        num_vertices = max(len(vertices) for vertices in candidates)
+        polygons_vertices = np.array([vertices + [vertices[-1]] * (num_vertices - len(vertices))
+                                      for vertices in candidates])
+
+        return segment_buffers_intersect_polygons(starts, ends, margin, polygons_vertices).any(axis=1)
+
     @abstractmethod
     def step_motion(self, dt):
         pass
@@ -228,6 +414,10 @@ class Map:
         """
         self._obstacles = self._initial_obstacles.copy()
         self._next_obstacle_id = max(self._obstacles.keys(), default=0) + 1
+        self.collision_cache.clear()
+        self._occupancy_grids.clear()
+        self._distance_fields.clear()
+        self._record_change('reset')
         self._reset()
 
     @abstractmethod
@@ -241,6 +431,10 @@ class Map:
         """
         self._obstacles = {}
         self._next_obstacle_id = 0
+        self.collision_cache.clear()
+        self._occupancy_grids.clear()
+        self._distance_fields.clear()
+        self._record_change('reset')
         self._clear()
 
     @abstractmethod
@@ -272,6 +466,10 @@ class Map:
             self._obstacles = obj._obstacles.copy()
             self._next_obstacle_id = max(self._obstacles.keys(), default=0) + 1
             self._current_goal = obj._current_goal
+            self.collision_cache.clear()
+            self._occupancy_grids.clear()
+            self._distance_fields.clear()
+            self._record_change('reset')
             self._load_from_pickle()
 
     @abstractmethod
@@ -294,6 +492,10 @@ class Map:
         self._obstacles = {o_dict['id']: Obstacle.from_dict(o_dict['obstacle']) for o_dict in data['obstacles']}
         self._initial_obstacles = self._obstacles.copy()
         self._next_obstacle_id = max(self._obstacles.keys(), default=0) + 1
+        self.collision_cache.clear()
+        self._occupancy_grids.clear()
+        self._distance_fields.clear()
+        self._record_change('reset')
         self._load_from_json_data()
 
     @abstractmethod
@@ -376,3 +578,7 @@ class Map:
         self._initial_obstacles = self._obstacles.copy()
         self._next_obstacle_id = len(obstacles)
         self._current_goal = goal
+        self.collision_cache.clear()
+        self._occupancy_grids.clear()
+        self._distance_fields.clear()
+        self._record_change('reset')
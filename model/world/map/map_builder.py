@@ -1,6 +1,8 @@
 from typing import Literal
 from model.world.map.standard_map import StandardMap
 from model.world.map.spatial_map import SpatialMap
+from model.world.map.rtree_map import RTreeMap
+from model.world.map.grid_hash_map import GridHashMap
 
 
 default_params = {
@@ -27,8 +29,9 @@ class MapBuilder:
 
         """
         Map type specifies the data structures used to carry out the computations.
-        Standard maps use simple lists, spatial maps use quad trees. Available 
-        values are 'list' and 'quadtree' 
+        Standard maps use simple lists, spatial maps use quad trees, R-tree
+        maps use bulk loaded R-trees and grid maps use a uniform spatial hash.
+        Available values are 'list', 'quadtree', 'rtree' and 'grid'
         """
         self.data_structure = 'list'
 
@@ -96,7 +99,7 @@ class MapBuilder:
         self.params_dictionary['grid'] = grid
         return self
 
-    def set_data_structure(self, data_structure: Literal['list', 'quadtree']):
+    def set_data_structure(self, data_structure: Literal['list', 'quadtree', 'rtree', 'grid']):
         self.data_structure = data_structure
         return self
 
@@ -106,6 +109,10 @@ class MapBuilder:
             map_arch = StandardMap
         elif self.data_structure == 'quadtree':
             map_arch = SpatialMap
+        elif self.data_structure == 'rtree':
+            map_arch = RTreeMap
+        elif self.data_structure == 'grid':
+            map_arch = GridHashMap
         else:
             raise ValueError(f'Unsupported map architecture: {self.data_structure}')
 
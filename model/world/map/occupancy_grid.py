@@ -0,0 +1,143 @@
+import math
+
+import numpy as np
+
+
+class OccupancyGrid:
+    """
+    Boolean raster of the map at a given resolution, inflated by the margin used by the
+    search algorithms. A cell is occupied if an obstacle comes closer than
+    resolution + margin/2 (per axis) to its center. Segments are tested by sampling
+    them with spacing at most resolution: given the inflation, if all the cells of the
+    samples are free, no obstacle is closer than margin/2 to the segment and the
+    segment is certainly free. Occupied cells are only a hint, the exact test is
+    needed to tell if the segment actually collides.
+    """
+
+    def __init__(self, bounds, resolution, margin):
+
+        if resolution <= 0:
+            raise ValueError(f'Invalid resolution: {resolution}')
+
+        self.bounds = tuple(bounds)
+        self.resolution = resolution
+        self.margin = margin
+
+        # Half side of the square around each cell center an obstacle must not touch
+        self.inflation = resolution + margin / 2
+
+        min_x, min_y, max_x, max_y = self.bounds
+        self.width = max(1, math.ceil((max_x - min_x) / resolution))
+        self.height = max(1, math.ceil((max_y - min_y) / resolution))
+
+        # Indexed as [i, j] with i along x and j along y
+        self.raster = np.zeros((self.width, self.height), dtype=bool)
+
+    def _window(self, bounds, window=None):
+        """
+        Returns the index range (min_i, min_j, max_i, max_j), inclusive, of the cells
+        whose center is within the inflation distance of the bounds
+        """
+
+        min_x, min_y, max_x, max_y = bounds
+        b_min_x, b_min_y = self.bounds[0], self.bounds[1]
+        min_i = max(0, math.ceil((min_x - self.inflation - b_min_x) / self.resolution - 0.5))
+        min_j = max(0, math.ceil((min_y - self.inflation - b_min_y) / self.resolution - 0.5))
+        max_i = min(self.width - 1, math.floor((max_x + self.inflation - b_min_x) / self.resolution - 0.5))
+        max_j = min(self.height - 1, math.floor((max_y + self.inflation - b_min_y) / self.resolution - 0.5))
+
+        if window is not None:
+            min_i, min_j = max(min_i, window[0]), max(min_j, window[1])
+            max_i, max_j = min(max_i, window[2]), min(max_j, window[3])
+
+        return min_i, min_j, max_i, max_j
+
+    def add_polygon(self, polygon, window=None):
+        """
+        Mark the cells occupied by the (convex) polygon. The test between the polygon and the
+        inflated square of each cell is a separating axis test vectorized over the cells
+        """
+
+        vertices = np.asarray(polygon.to_point_array(), dtype=np.float64)
+        min_i, min_j, max_i, max_j = self._window(tuple(vertices.min(axis=0)) + tuple(vertices.max(axis=0)), window)
+        if min_i > max_i or min_j > max_j:
+            return
+
+        centers_x = self.bounds[0] + (np.arange(min_i, max_i + 1) + 0.5) * self.resolution
+        centers_y = self.bounds[1] + (np.arange(min_j, max_j + 1) + 0.5) * self.resolution
+        centers = np.stack(np.meshgrid(centers_x, centers_y, indexing='ij'), axis=-1)
+
+        # The axes of the squares are already covered by the window, test the edge normals
+        edges = np.roll(vertices, -1, axis=0) - vertices
+        normals = np.stack((-edges[:, 1], edges[:, 0]), axis=1)
+
+        projections = vertices @ normals.T
+        poly_min, poly_max = projections.min(axis=0), projections.max(axis=0)
+
+        center_projections = centers @ normals.T
+        square_radius = self.inflation * (np.abs(normals[:, 0]) + np.abs(normals[:, 1]))
+
+        overlap = ((center_projections - square_radius <= poly_max) &
+                   (center_projections + square_radius >= poly_min)).all(axis=-1)
+
+        self.raster[min_i:max_i + 1, min_j:max_j + 1] |= overlap
+
+    def update_region(self, bounds, polygons):
+        """
+        Recompute the cells affected by a change in the bounds, given the polygons that
+        can occupy them (e.g. after the removal of an obstacle)
+        """
+
+        window = self._window(bounds)
+        min_i, min_j, max_i, max_j = window
+        if min_i > max_i or min_j > max_j:
+            return
+
+        self.raster[min_i:max_i + 1, min_j:max_j + 1] = False
+        for polygon in polygons:
+            self.add_polygon(polygon, window)
+
+    def is_region_free(self, bounds):
+        """
+        Returns True if all the cells covering the bounds are free, i.e. every segment
+        within the bounds is certainly free. Only the part of the bounds inside the raster
+        is looked at
+        """
+
+        min_x, min_y, max_x, max_y = bounds
+        min_i = max(0, math.floor((min_x - self.bounds[0]) / self.resolution))
+        min_j = max(0, math.floor((min_y - self.bounds[1]) / self.resolution))
+        max_i = min(self.width - 1, math.floor((max_x - self.bounds[0]) / self.resolution))
+        max_j = min(self.height - 1, math.floor((max_y - self.bounds[1]) / self.resolution))
+
+        return not self.raster[min_i:max_i + 1, min_j:max_j + 1].any()
+
+    def are_segments_free(self, starts, ends):
+        """
+        Given two (K, 2) arrays of start and end points, returns a boolean array that is True
+        where the segment is certainly free. Segments leaving the raster are never reported free
+        """
+
+        starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+        ends = np.asarray(ends, dtype=np.float64).reshape(-1, 2)
+
+        if len(starts) == 0:
+            return np.zeros(0, dtype=bool)
+
+        directions = ends - starts
+        max_length = math.sqrt(float((directions * directions).sum(axis=1).max()))
+        num_samples = math.ceil(max_length / self.resolution) + 1
+
+        t = np.arange(num_samples) / max(1, num_samples - 1)
+        samples = starts[:, None, :] + t[None, :, None] * directions[:, None, :]
+
+        i = np.floor((samples[..., 0] - self.bounds[0]) / self.resolution).astype(np.int64)
+        j = np.floor((samples[..., 1] - self.bounds[1]) / self.resolution).astype(np.int64)
+        inside = (i >= 0) & (i < self.width) & (j >= 0) & (j < self.height)
+
+        if not inside.all():
+            free = inside.all(axis=1)
+            free[free] = ~self.raster[i[free], j[free]].any(axis=1)
+            return free
+
+        return ~self.raster[i, j].any(axis=1)
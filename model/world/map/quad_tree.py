@@ -7,87 +7,113 @@ import matplotlib.patches as patches
 
 
 class QuadTreeNode:
-    def __init__(self, bounds, max_polygons_per_region=4):
+    def __init__(self, bounds, max_polygons_per_region=4, max_depth=10, depth=0, parent=None):
         self.bounds = bounds
         self.max_polygon_per_region = max_polygons_per_region
+        self.max_depth = max_depth
+        self.depth = depth
+        self.parent = parent
         self.children = [None, None, None, None]  # NW, NE, SW, SE
-        self.polygons = []
 
-    def insert(self, polygon_id, polygon):
-
-        if not self.in_bounds(polygon.get_bounds()):
-            return False
+        # Polygons are only stored in the leaves: polygon_id -> (polygon, polygon_bounds)
+        self.polygons = {}
 
-        if len(self.polygons) < self.max_polygon_per_region:  # If there's space, insert the polygon here
-            self.polygons.append((polygon_id, polygon))
-            return True
-
-        # If the node is a leaf, split it into four children
-        if all(child is None for child in self.children):
-            self.split()
+    def is_leaf(self):
+        return self.children[0] is None
 
-        # Recursively insert the polygon into one of the children
+    def insert(self, polygon_id, polygon, polygon_bounds, leaves):
         """
-        for i in range(len(self.children)):
-            if self.children[i].insert(polygon_id, polygon):
-                return True
+        Insert the polygon in all the leaves it overlaps. The leaves the polygon
+        ends up in are added to the leaves dictionary (polygon_id -> set of leaves)
         """
-        inserted = []
-        for i in range(len(self.children)):
-            inserted.append(self.children[i].insert(polygon_id, polygon))
 
-        return any(inserted)
+        if not self.in_bounds(polygon_bounds):
+            return False
+
+        if self.is_leaf():
 
-    def remove(self, polygon_id):
-        # Remove the polygon with the specified ID from the node
-        self.polygons = [polygon for polygon in self.polygons if polygon[0] != polygon_id]
+            self.polygons[polygon_id] = (polygon, polygon_bounds)
+            leaves.setdefault(polygon_id, set()).add(self)
+
+            # Split the leaf if it is full and it can still go deeper
+            if len(self.polygons) > self.max_polygon_per_region and self.depth < self.max_depth:
+                self.split(leaves)
 
-        # Recursively remove the polygon from the children
+            return True
+
+        inserted = False
         for child in self.children:
-            if child is not None:
-                child.remove(polygon_id)
+            inserted |= child.insert(polygon_id, polygon, polygon_bounds, leaves)
 
-    def query_region(self, query_bounds):
-        result = []
+        return inserted
+
+    def query_region(self, query_bounds, result):
+        """
+        Add to the result set the IDs of the polygons whose bounds intersect the query region
+        """
 
         # Check if the node's bounds intersect with the query region
         if not self.in_bounds(query_bounds):
-            return result
+            return
 
-        # Add IDs of polygons in the node that intersect with the query region
-        for polygon_id, polygon in self.polygons:
-            if self.intersects(polygon.get_bounds(), query_bounds):
-                result.append(polygon_id)
+        if self.is_leaf():
+            for polygon_id, (polygon, polygon_bounds) in self.polygons.items():
+                if polygon_id not in result and self.intersects(polygon_bounds, query_bounds):
+                    result.add(polygon_id)
+            return
 
         # Recursively query the children
         for child in self.children:
-            if child is not None:
-                result.extend(child.query_region(query_bounds))
-
-        return result
+            child.query_region(query_bounds, result)
 
     def in_bounds(self, polygon_bounds):
         min_x, min_y, max_x, max_y = self.bounds
         p_min_x, p_min_y, p_max_x, p_max_y = polygon_bounds
         return not (p_max_x < min_x or p_min_x > max_x or p_max_y < min_y or p_min_y > max_y)
 
-    def split(self):
+    def split(self, leaves):
         min_x, min_y, max_x, max_y = self.bounds
         mid_x, mid_y = (min_x + max_x) / 2, (min_y + max_y) / 2
 
-        self.children[0] = QuadTreeNode((mid_x, mid_y, max_x, max_y))  # NW
-        self.children[1] = QuadTreeNode((min_x, mid_y, mid_x, max_y))  # NE
-        self.children[2] = QuadTreeNode((min_x, min_y, mid_x, mid_y))  # SW
-        self.children[3] = QuadTreeNode((mid_x, min_y, max_x, mid_y))  # SE
+        child_args = dict(max_polygons_per_region=self.max_polygon_per_region, max_depth=self.max_depth,
+                          depth=self.depth + 1, parent=self)
+        self.children[0] = QuadTreeNode((mid_x, mid_y, max_x, max_y), **child_args)  # NW
+        self.children[1] = QuadTreeNode((min_x, mid_y, mid_x, max_y), **child_args)  # NE
+        self.children[2] = QuadTreeNode((min_x, min_y, mid_x, mid_y), **child_args)  # SW
+        self.children[3] = QuadTreeNode((mid_x, min_y, max_x, mid_y), **child_args)  # SE
 
         # Reallocate polygons to children
-        for polygon_id, polygon in self.polygons:
+        polygons = self.polygons
+        self.polygons = {}
+        for polygon_id, (polygon, polygon_bounds) in polygons.items():
+            leaves[polygon_id].discard(self)
             for child in self.children:
-                if child.in_bounds(polygon.get_bounds()):
-                    child.insert(polygon_id, polygon)
-                    # break
+                child.insert(polygon_id, polygon, polygon_bounds, leaves)
 
-        self.polygons = []  # Clear polygons from the current node
+    def try_merge(self, leaves):
+        """
+        Collapse the children into this node if they are all leaves and together
+        hold no more polygons than a single leaf can. Returns True on merge
+        """
+
+        if self.is_leaf() or not all(child.is_leaf() for child in self.children):
+            return False
+
+        polygons = {}
+        for child in self.children:
+            polygons.update(child.polygons)
+
+        if len(polygons) > self.max_polygon_per_region:
+            return False
+
+        for polygon_id in polygons:
+            polygon_leaves = leaves[polygon_id]
+            polygon_leaves.difference_update(self.children)
+            polygon_leaves.add(self)
+
+        self.polygons = polygons
+        self.children = [None, None, None, None]
+        return True
 
     @staticmethod
     def intersects(bounds1, bounds2):
@@ -107,22 +133,15 @@ class QuadTreeNode:
         min_x1, min_y1, max_x1, max_y1 = bounds1
         min_x2, min_y2, max_x2, max_y2 = bounds2
 
-        # Check for horizontal overlap
-        horizontal_overlap = max_x1 > min_x2 and min_x1 < max_x2
-
-        # Check for vertical overlap
-        vertical_overlap = max_y1 > min_y2 and min_y1 < max_y2
-
-        # Both horizontal and vertical overlap is required for rectangles to intersect
-        return horizontal_overlap and vertical_overlap
-
-        # return not (max_x1 < min_x2 or min_x1 > max_x2 or max_y1 < min_y2 or min_y1 > max_y2)
+        # Rectangles that only touch are reported too, like in_bounds does, so that
+        # degenerate query regions (e.g. the bounds of an axis aligned segment) work
+        return not (max_x1 < min_x2 or min_x1 > max_x2 or max_y1 < min_y2 or min_y1 > max_y2)
 
     def iterate(self):
         result = []
 
         # Add polygons in the node
-        result.extend(self.polygons)
+        result.extend((polygon_id, polygon) for polygon_id, (polygon, _) in self.polygons.items())
 
         # Recursively gather polygons from the children
         for child in self.children:
@@ -141,8 +160,8 @@ class QuadTreeNode:
             if child is not None:
                 child.draw(ax)
 
-        for polygon_id, polygon in self.polygons:
-            p_min_x, p_min_y, p_max_x, p_max_y = polygon.get_bounds()
+        for polygon_id, (polygon, polygon_bounds) in self.polygons.items():
+            p_min_x, p_min_y, p_max_x, p_max_y = polygon_bounds
             rect = patches.Rectangle((p_min_x, p_min_y), p_max_x - p_min_x, p_max_y - p_min_y, linewidth=1,
                                      edgecolor='r', facecolor='none')
             ax.add_patch(rect)
@@ -155,32 +174,75 @@ class QuadTreeNode:
 
 class QuadTree:
 
-    def __init__(self, bounds):
+    def __init__(self, bounds, max_polygons_per_region=4, max_depth=10):
+        """
+        Region quad tree storing the polygons in every leaf their bounding box overlaps.
+        Leaves split when they hold more than max_polygons_per_region polygons, unless
+        they are already max_depth levels deep (many overlapping polygons would
+        otherwise split the tree forever). The tree keeps a polygon_id -> leaves index,
+        so that removing a polygon only touches the leaves holding it; siblings that
+        become underfull after a removal are merged back into their parent.
+        """
+
         self.initial_bounds = bounds
-        self.root = QuadTreeNode(bounds)
+        self.max_polygons_per_region = max_polygons_per_region
+        self.max_depth = max_depth
+
+        self.root = self._new_root()
+
+        # polygon_id -> set of leaves containing the polygon
+        self._leaves = {}
+
+    def _new_root(self):
+        return QuadTreeNode(self.initial_bounds, max_polygons_per_region=self.max_polygons_per_region,
+                            max_depth=self.max_depth)
 
     def reset(self):
-        self.root = QuadTreeNode(self.initial_bounds)
+        self.root = self._new_root()
+        self._leaves = {}
 
     def insert(self, polygon_id, polygon):
-        return self.root.insert(polygon_id, polygon)
+
+        # Re-inserting a polygon replaces the old one
+        if polygon_id in self._leaves:
+            self.remove(polygon_id)
+
+        return self.root.insert(polygon_id, polygon, tuple(polygon.get_bounds()), self._leaves)
 
     def remove(self, polygon_id):
-        # Remove the polygon from the quad tree starting from the root
-        self.root.remove(polygon_id)
+        leaves = self._leaves.pop(polygon_id, ())
+
+        parents = set()
+        for leaf in leaves:
+            del leaf.polygons[polygon_id]
+            if leaf.parent is not None:
+                parents.add(leaf.parent)
+
+        # Merge underfull children bottom-up
+        for node in sorted(parents, key=lambda n: -n.depth):
+            while node is not None and node.try_merge(self._leaves):
+                node = node.parent
 
     def query_region(self, query_bounds):
-        # Query the quad tree starting from the root
-        return self.root.query_region(query_bounds)
+        # Query the quad tree starting from the root, each polygon is reported once
+        result = set()
+        self.root.query_region(query_bounds, result)
+        return list(result)
 
     def iterate(self):
-        # Iterate over all polygons in the quad tree starting from the root
-        return self.root.iterate()
+        # Iterate over all polygons in the quad tree starting from the root, each polygon is reported once
+        return list({polygon_id: polygon for polygon_id, polygon in self.root.iterate()}.items())
 
     def __iter__(self):
         # Use the iterate_all_polygons method to make QuadTree iterable
         return iter(self.iterate())
 
+    def __len__(self):
+        return len(self._leaves)
+
+    def __contains__(self, polygon_id):
+        return polygon_id in self._leaves
+
     def draw(self):
         fig, ax = plt.subplots()
         ax.set_xlim(self.root.bounds[0], self.root.bounds[2])
@@ -0,0 +1,111 @@
+from rtree import index
+
+from model.geometry.intersection import check_intersection
+
+from model.world.map.map import Map
+
+
+class RTreeMap(Map):
+
+    def __init__(self, node_capacity=16, **kwargs):
+        """
+        This implementation of the Map interface uses an R-tree (libspatialindex through
+        the rtree package) to make spatial queries. Whenever the whole obstacle set is
+        replaced (generate, load, reset) the tree is rebuilt by bulk loading the obstacles
+        with STR (Sort-Tile-Recursive) packing; single obstacles are inserted/deleted
+        incrementally.
+        """
+
+        super().__init__(**kwargs)
+
+        # Maximum number of entries of the nodes of the tree
+        self.node_capacity = node_capacity
+
+        # Bounds each obstacle has been indexed with, needed to delete it from the tree
+        self._indexed_bounds = {}
+
+        self.rtree = self._build_rtree()
+
+    def _build_rtree(self):
+        """
+        Bulk load the current obstacles into a new R-tree
+        """
+
+        properties = index.Property()
+        properties.dimension = 2
+        properties.index_capacity = self.node_capacity
+        properties.leaf_capacity = self.node_capacity
+        properties.near_minimum_overlap_factor = max(1, self.node_capacity // 2)
+
+        self._indexed_bounds = {obstacle_id: tuple(obstacle.get_bounds())
+                                for obstacle_id, obstacle in self._obstacles.items()}
+
+        if len(self._indexed_bounds) == 0:
+            return index.Index(properties=properties)
+
+        # Streaming the data to the constructor triggers the STR bulk loading
+        stream = ((obstacle_id, bounds, None) for obstacle_id, bounds in self._indexed_bounds.items())
+        return index.Index(stream, properties=properties)
+
+    def _add_obstacle(self, obstacle):
+        """
+        Additional logic to handle the R-tree
+        """
+        bounds = tuple(obstacle.get_bounds())
+        self._indexed_bounds[self._next_obstacle_id] = bounds
+        self.rtree.insert(self._next_obstacle_id, bounds)
+
+    def _remove_obstacle(self, obstacle_id):
+        """
+        Additional logic to handle the R-tree
+        """
+        bounds = self._indexed_bounds.pop(obstacle_id, None)
+        if bounds is not None:
+            self.rtree.delete(obstacle_id, bounds)
+
+    def query_polygon(self, polygon):
+        result = []
+        for obj_id in self.rtree.intersection(polygon.get_bounds()):
+
+            # Check if the actual geometry intersects with the query region
+            if check_intersection(polygon, self._obstacles[obj_id].polygon):
+                result.append(obj_id)
+
+        return result
+
+    def query_bounds(self, bounds):
+        """
+        Redefine query_bounds to make it more efficient
+        """
+        return list(self.rtree.intersection(bounds))
+
+    def step_motion(self, dt):
+
+        # Do nothing for this kind of map, obstacles should stay still
+        pass
+
+    def _reset(self):
+        self.rtree = self._build_rtree()
+
+    def _clear(self):
+        self.rtree = self._build_rtree()
+
+    def generate(self, forbidden_zones):
+        super().generate(forbidden_zones)
+        self.rtree = self._build_rtree()
+
+    def _load_from_pickle(self):
+        self.rtree = self._build_rtree()
+
+    def _load_from_json_data(self):
+        self.rtree = self._build_rtree()
+
+    def __getstate__(self):
+        # The R-tree lives in native memory and can't be pickled, it is rebuilt on load
+        state = self.__dict__.copy()
+        del state['rtree']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.rtree = self._build_rtree()
@@ -219,6 +219,7 @@ class World:
                 max_iterations=max_iterations,
                 iterations_per_step=iterations_per_step
             )
+            current_controller.search_algorithm.time_budget = search_algorithm_dict.get("time_budget")
 
         for robot, controller in zip(self.robots, self.controllers):
             controller.reset(robot.current_pose)